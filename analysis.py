@@ -3,10 +3,12 @@ Aircraft Maintenance Work Order Analysis Module
 Analyzes Work Orders from AMOS system to identify recurring failures and remediation effectiveness
 """
 
+import numpy as np
 import pandas as pd
 import re
 from dataclasses import dataclass
-from typing import List, Dict, Tuple
+from functools import lru_cache
+from typing import List, Dict, Tuple, Optional
 from datetime import datetime
 
 
@@ -25,13 +27,132 @@ CORRECTIVE_KEYWORDS = [
     'swap', 'swapped'
 ]
 
+
+def keyword_trie_pattern(keywords: List[str]) -> 're.Pattern':
+    """
+    Compile keywords into one prefix-trie regex for substring search.
+    Keywords containing a shorter keyword can never change the outcome and
+    are dropped; the rest are merged so the alternation shares common prefixes
+    and each position tries fewer branches.
+    """
+    minimal = sorted({k for k in keywords if not any(o != k and o in k for o in keywords)})
+    trie = {}
+    for keyword in minimal:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+    
+    def to_regex(node: dict) -> str:
+        branches = [re.escape(char) + to_regex(child) for char, child in sorted(node.items())]
+        if len(branches) <= 1:
+            return ''.join(branches)
+        return '(?:' + '|'.join(branches) + ')'
+    
+    return re.compile(to_regex(trie))
+
+
+# Keyword tries for classify_action (substring match on lower-cased text)
+CORRECTIVE_PATTERN = keyword_trie_pattern(CORRECTIVE_KEYWORDS)
+RESET_PATTERN = keyword_trie_pattern(RESET_KEYWORDS)
+
+# Category sets for the action_type and conclusion columns
+ACTION_TYPES = ['UNKNOWN', 'RESET_ONLY', 'CORRECTIVE_ACTION']
+CONCLUSIONS = ['SINGLE_EVENT', 'RESET_ONLY_REPEAT', 'CORRECTIVE_OK', 'CORRECTIVE_NOT_EFFECTIVE']
+RED_FLAG_CONCLUSIONS = ['RESET_ONLY_REPEAT', 'CORRECTIVE_NOT_EFFECTIVE']
+
+# Columns of the results_to_dataframe summary table
+SUMMARY_COLUMNS = ['A/C', 'ATA', 'Ngày xảy ra', 'Số WO', 'Kết luận', 'Tóm tắt tình trạng']
+
+# Column name variations (casefolded) -> standard column names used by the analysis
+COLUMN_MAPPING = {
+    'a/c': 'A/C',
+    'aircraft': 'A/C',
+    'ac': 'A/C',
+    'ata': 'ATA',
+    'ata chapter': 'ATA',
+    'wo': 'WO',
+    'work order': 'WO',
+    'workorder': 'WO',
+    'w/o': 'WO',
+    'w/o action': 'W/O Action',
+    'work order action': 'W/O Action',
+    'action': 'W/O Action',
+    'w/o_action': 'W/O Action',
+    'issued': 'Issued',
+    'issue date': 'Issued',
+    'date issued': 'Issued',
+    'issue_date': 'Issued',
+    'issued_date': 'Issued',
+    'w/o description': 'W/O Description',
+    'work order description': 'W/O Description',
+    'description': 'ATA Description',
+    'w/o_description': 'W/O Description',
+    'desc': 'ATA Description',
+    'type': 'Type',
+    'wo type': 'Type',
+    'work type': 'Type',
+    'wo_type': 'Type',
+    'w/o_type': 'Type',
+    'record_type': 'Type'
+}
+
+# Type values normalized to standard abbreviations (M, C, P, S)
+TYPE_MAPPING = {
+    'M': 'M',
+    'C': 'C',
+    'P': 'P',
+    'S': 'S',
+    'MAINTENANCE DEFECT': 'M',
+    'CABIN DEFECT': 'C',
+    'PILOT REPORT': 'P',
+    'SCHEDULED W/O': 'S',
+    'SCHEDULED': 'S',
+    'SCHEDULE': 'S'
+}
+
 # ATA prefixes to exclude
-EXCLUDED_ATA_PREFIXES = ['00','05','08','09','10','11','12','13','14','15','16','17','18','19','25', '33', '50', '51', '52', '53', '54', '55', '56', '57', '58', '59']
+EXCLUDED_ATA_PREFIXES = frozenset(['00','05','08','09','10','11','12','13','14','15','16','17','18','19','25', '33', '50', '51', '52', '53', '54', '55', '56', '57', '58', '59'])
+
+# Full ATA exclusions (44-2x, 23-3x, 32-41), in both xx-xx and 4-digit form
+EXCLUDED_ATA_PATTERN = re.compile(r'^(?:44-2|23-3|32-41|442\d$|233\d$|3241$)')
+
+# AMOS metadata lines removed by clean_amos_metadata, together with their line break:
+# "1 WORKSTEP ADDED BY ... ON ...", "ACTION PERFORMED BY ... ON ...",
+# "DESCRIPTION SIGN ...", "PERFORMED SIGN ..." (whitespace never spans lines)
+AMOS_METADATA_LINE_PATTERN = re.compile(
+    r'(?im)^[^\S\n]*(?:'
+    r'\d+[^\S\n]+WORKSTEP[^\S\n]+ADDED[^\S\n]+BY[^\S\n]+\w+[^\S\n]+ON[^\S\n]+\S'
+    r'|ACTION[^\S\n]+PERFORMED[^\S\n]+BY[^\S\n]+\w+[^\S\n]+ON[^\S\n]+\S'
+    r'|DESCRIPTION[^\S\n]+SIGN[^\S\n]+\w'
+    r'|PERFORMED[^\S\n]+SIGN[^\S\n]+\w'
+    r').*(?:\n|$)'
+)
+MULTIPLE_NEWLINES_PATTERN = re.compile(r'\n\s*\n+')
+
+# Task reference patterns for ATA correction, in precedence order: keywords by tier
+# (TSM > AFI > FIM, then IPC > IPD, then AMM), and per keyword colon, then TASK, then space.
+# (keyword)(colon/TASK/space)(ATA like 72-32-86 -> "72-32" or 723286 -> "7232")
+ATA_REFERENCE_KEYWORDS = ['TSM', 'AFI', 'FIM', 'IPC', 'IPD', 'AMM']
+ATA_REFERENCE_SEPARATORS = [r'\s*:\s*', r'\s+TASK\s+', r'\s+']
+ATA_REFERENCE_PATTERNS = [
+    re.compile(rf'{keyword}{separator}(\d{{2}})-?(\d{{2}})')
+    for keyword in ATA_REFERENCE_KEYWORDS
+    for separator in ATA_REFERENCE_SEPARATORS
+]
+# Matches exactly when one of ATA_REFERENCE_PATTERNS does: texts without any reference skip the ordered scan
+ATA_REFERENCE_PATTERN = re.compile(
+    r'(?:' + '|'.join(ATA_REFERENCE_KEYWORDS) + r')(?:' + '|'.join(ATA_REFERENCE_SEPARATORS) + r')\d{2}-?\d{2}'
+)
+
+FIRST_SENTENCE_PATTERN = re.compile(r'[^.!?]*[.!?]')
+LEADING_SEPARATORS_PATTERN = re.compile(r'^[:;\-\s]+')
 
 
 @dataclass
 class WorkOrderEvent:
     """Represents a single work order event"""
+    __slots__ = ('wo', 'description', 'action', 'action_type', 'wo_type', 'issued_date')
+    
     wo: str
     description: str
     action: str
@@ -43,6 +164,8 @@ class WorkOrderEvent:
 @dataclass
 class AnalysisResult:
     """Represents analysis result for an A/C + ATA combination"""
+    __slots__ = ('aircraft', 'ata', 'ata_2digit', 'wo_count', 'conclusion', 'dates', 'timeline_summary', 'events')
+    
     aircraft: str
     ata: str
     ata_2digit: str
@@ -85,6 +208,32 @@ def format_ata(ata: str) -> str:
     return ata_str
 
 
+def ata_text_column(ata: pd.Series) -> pd.Series:
+    """ATA values as stripped text ('' when missing), the input of the *_column helpers"""
+    return ata.astype(str).where(ata.notna(), '').str.strip()
+
+
+def get_ata_2digit_column(ata_str: pd.Series) -> pd.Series:
+    """Column-wise get_ata_2digit over ata_text_column output"""
+    return ata_str.str.split('-', n=1).str[0].where(ata_str.str.contains('-', regex=False), ata_str.str[:2])
+
+
+def format_ata_column(ata_str: pd.Series) -> pd.Series:
+    """Column-wise format_ata over ata_text_column output"""
+    ata_str = ata_str.str.replace(' ', '', regex=False)
+    length = ata_str.str.len()
+    formatted = np.select(
+        [
+            ata_str.str.contains('-', regex=False),
+            (length == 4) & ata_str.str.isdigit(),
+            length == 2,
+        ],
+        [ata_str, ata_str.str[:2] + '-' + ata_str.str[2:], ata_str + '-00'],
+        default=ata_str
+    )
+    return pd.Series(formatted.tolist(), index=ata_str.index)
+
+
 def clean_amos_metadata(text: str) -> str:
     """
     Clean AMOS system metadata from W/O Description and W/O Action text.
@@ -97,42 +246,20 @@ def clean_amos_metadata(text: str) -> str:
     if pd.isna(text) or not text:
         return ""
     
-    text_str = str(text).strip()
-    
-    # Split into lines for processing
-    lines = text_str.split('\n')
-    cleaned_lines = []
-    
-    for line in lines:
-        line_upper = line.strip().upper()
-        
-        # Skip lines that match metadata patterns
-        # Pattern 1: "1 WORKSTEP ADDED BY ... ON ..."
-        if re.match(r'^\d+\s+WORKSTEP\s+ADDED\s+BY\s+\w+\s+ON\s+', line_upper):
-            continue
-        
-        # Pattern 2: "ACTION PERFORMED BY ... ON ..."
-        if re.match(r'^ACTION\s+PERFORMED\s+BY\s+\w+\s+ON\s+', line_upper):
-            continue
-        
-        # Pattern 3: "DESCRIPTION SIGN ..."
-        if re.match(r'^DESCRIPTION\s+SIGN\s+\w+', line_upper):
-            continue
-        
-        # Pattern 4: "PERFORMED SIGN ..."
-        if re.match(r'^PERFORMED\s+SIGN\s+\w+', line_upper):
-            continue
-        
-        # Keep this line
-        cleaned_lines.append(line)
-    
-    # Join back and clean up extra whitespace
-    cleaned_text = '\n'.join(cleaned_lines).strip()
+    cleaned_text = AMOS_METADATA_LINE_PATTERN.sub('', str(text)).strip()
     
     # Remove multiple consecutive newlines
-    cleaned_text = re.sub(r'\n\s*\n+', '\n', cleaned_text)
-    
-    return cleaned_text
+    return MULTIPLE_NEWLINES_PATTERN.sub('\n', cleaned_text)
+
+
+def clean_amos_metadata_column(texts: pd.Series) -> pd.Series:
+    """Column-wise clean_amos_metadata using pandas string kernels"""
+    return (
+        texts.fillna('').astype(str)
+        .str.replace(AMOS_METADATA_LINE_PATTERN, '', regex=True)
+        .str.strip()
+        .str.replace(MULTIPLE_NEWLINES_PATTERN, '\n', regex=True)
+    )
 
 
 def extract_ata_from_text(description: str, action: str, original_ata: str) -> str:
@@ -155,55 +282,33 @@ def extract_ata_from_text(description: str, action: str, original_ata: str) -> s
     """
     # Combine both texts for searching
     combined_text = f"{str(description)} {str(action)}" if not pd.isna(description) and not pd.isna(action) else ""
-    combined_text = combined_text.upper()
-    
-    # Define reference patterns with priority
-    # Pattern: (keyword)(optional: colon/task/space)(ATA pattern like 72-32-86 or 7232)
-    reference_patterns = {
-        'high': ['TSM', 'AFI', 'FIM'],
-        'medium': ['IPC', 'IPD'],
-        'low': ['AMM']
-    }
     
-    # ATA pattern: captures xx-xx or xxxx at start of reference number
-    # Example: "72-32-86-..." -> captures "72-32"
-    # Example: "723286..." -> captures "7232"
-    ata_pattern = r'(\d{2}[-]?\d{2})'
-    
-    found_atas = {'high': [], 'medium': [], 'low': []}
-    
-    for priority, keywords in reference_patterns.items():
-        for keyword in keywords:
-            # Pattern variations: "TSM:", "TSM TASK", "TSM 72-32", etc.
-            patterns = [
-                rf'{keyword}\s*:\s*{ata_pattern}',
-                rf'{keyword}\s+TASK\s+{ata_pattern}',
-                rf'{keyword}\s+{ata_pattern}',
-            ]
-            
-            for pattern in patterns:
-                matches = re.findall(pattern, combined_text)
-                if matches:
-                    for match in matches:
-                        # Clean up the match
-                        ata_code = match.replace(' ', '').replace('-', '')
-                        if len(ata_code) >= 4 and ata_code.isdigit():
-                            # Format as xx-xx
-                            formatted = f"{ata_code[:2]}-{ata_code[2:4]}"
-                            found_atas[priority].append(formatted)
-    
-    # Return based on priority
-    if found_atas['high']:
-        return found_atas['high'][0]
-    elif found_atas['medium']:
-        return found_atas['medium'][0]
-    elif found_atas['low']:
-        return found_atas['low'][0]
-    else:
-        # No reference found, use original ATA
-        return format_ata(original_ata)
+    ata = find_ata_reference(combined_text.upper())
+    if ata is not None:
+        return ata
+    
+    # No reference found, use original ATA
+    return format_ata(original_ata)
 
 
+@lru_cache(maxsize=2**16)
+def find_ata_reference(text_upper: str) -> Optional[str]:
+    """
+    Return the highest-priority task reference ATA (xx-xx) in upper-cased text, or None.
+    Memoized: template W/Os repeat the same description/action text many times.
+    """
+    # One pre-filter scan; only texts holding a reference go through the ordered patterns
+    if not ATA_REFERENCE_PATTERN.search(text_upper):
+        return None
+    
+    # The first pattern in precedence order with a match wins (its first match in the text),
+    # not the reference that happens to come first in the text
+    for pattern in ATA_REFERENCE_PATTERNS:
+        match = pattern.search(text_upper)
+        if match:
+            return f"{match.group(1)}-{match.group(2)}"
+    return None
+
 
 def classify_action(action: str) -> str:
     """
@@ -218,18 +323,32 @@ def classify_action(action: str) -> str:
     action_lower = str(action).lower()
     
     # Check for corrective keywords first (higher priority)
-    for keyword in CORRECTIVE_KEYWORDS:
-        if keyword in action_lower:
-            return "CORRECTIVE_ACTION"
+    if CORRECTIVE_PATTERN.search(action_lower):
+        return "CORRECTIVE_ACTION"
     
     # Check for reset keywords
-    for keyword in RESET_KEYWORDS:
-        if keyword in action_lower:
-            return "RESET_ONLY"
+    if RESET_PATTERN.search(action_lower):
+        return "RESET_ONLY"
     
     return "UNKNOWN"
 
 
+def classify_actions(actions: pd.Series) -> pd.Series:
+    """Vectorized classify_action over a W/O Action column"""
+    # Template actions repeat a lot: classify each distinct text only once
+    codes, uniques = pd.factorize(actions.fillna('').astype(str))
+    uniques_lower = pd.Series(uniques, dtype=object).str.lower()
+    is_corrective = uniques_lower.str.contains(CORRECTIVE_PATTERN).to_numpy(dtype=bool)
+    is_reset = uniques_lower.str.contains(RESET_PATTERN).to_numpy(dtype=bool)
+    unique_codes = np.select(
+        [is_corrective, is_reset],
+        [ACTION_TYPES.index("CORRECTIVE_ACTION"), ACTION_TYPES.index("RESET_ONLY")],
+        default=ACTION_TYPES.index("UNKNOWN")
+    )
+    action_types = pd.Categorical.from_codes(unique_codes[codes], categories=ACTION_TYPES)
+    return pd.Series(action_types, index=actions.index)
+
+
 def should_exclude_ata(ata: str) -> bool:
     """
     Check if ATA should be excluded from analysis.
@@ -237,108 +356,66 @@ def should_exclude_ata(ata: str) -> bool:
     - 2-digit prefixes in EXCLUDED_ATA_PREFIXES
     - Pattern 44-2x (44-20 to 44-29)
     - Pattern 23-3x (23-30 to 23-39)
+    - Pattern 32-41
     """
-    if pd.isna(ata):
-        return False
-    
-    ata_str = str(ata).strip()
-    ata_2digit = get_ata_2digit(ata)
-    
-    # Check 2-digit prefix exclusion
-    if ata_2digit in EXCLUDED_ATA_PREFIXES:
-        return True
-    
-    # Check pattern-based exclusion for full ATA codes
-    # Format ATA to ensure it's in xx-xx format
-    ata_formatted = format_ata(ata_str)
-    
-    # Pattern 44-2x (44-20 to 44-29)
-    if ata_formatted.startswith('44-2'):
-        return True
-    
-    # Pattern 23-3x (23-30 to 23-39)
-    if ata_formatted.startswith('23-3'):
-        return True
-    # Pattern 32-41 (32-41)
-    if ata_formatted.startswith('32-41'):
-        return True
+    ata_str = ata_text_column(pd.Series([ata], dtype=object))
+    return bool(exclude_ata_mask(ata_str, get_ata_2digit_column(ata_str)).iloc[0])
+
+
+def exclude_ata_mask(ata_str: pd.Series, ata_2digit: pd.Series) -> pd.Series:
+    """
+    Vectorized should_exclude_ata: True for every ATA value to exclude.
+    Takes ata_text_column output and its get_ata_2digit_column prefixes,
+    so filter_data can reuse both for the formatted columns.
+    """
+    # Pattern-based exclusion, checked on the space-free form like format_ata
+    compact = ata_str.str.replace(' ', '', regex=False)
+    pattern_hit = compact.str.match(EXCLUDED_ATA_PATTERN, na=False)
     
-    return False
+    return ata_2digit.isin(EXCLUDED_ATA_PREFIXES) | pattern_hit
+
+
+def text_column(df: pd.DataFrame, column: str) -> pd.Series:
+    """Return a column as text with missing values blank (all blank if the column is absent)"""
+    if column not in df.columns:
+        return pd.Series('', index=df.index, dtype=object)
+    return df[column].fillna('').astype(str)
 
 
 def filter_data(df: pd.DataFrame) -> pd.DataFrame:
     """Filter out excluded ATA codes and clean data"""
-    # Create a copy
-    df = df.copy()
-    
     # Ensure ATA column exists
     if 'ATA' not in df.columns:
         return df
     
-    # Filter out excluded ATAs
-    mask = ~df['ATA'].apply(should_exclude_ata)
-    df_filtered = df[mask].copy()
+    # Stringify ATA and take its 2-digit prefix once; both serve the exclusion
+    # check and the formatted columns
+    ata_str = ata_text_column(df['ATA'])
+    ata_2digit = get_ata_2digit_column(ata_str)
+    keep = ~exclude_ata_mask(ata_str, ata_2digit)
     
-    # Format ATA to xx-xx
-    df_filtered['ATA_Formatted'] = df_filtered['ATA'].apply(format_ata)
-    df_filtered['ATA_2Digit'] = df_filtered['ATA'].apply(get_ata_2digit)
+    # Filter out excluded ATAs; the boolean selection is already a new frame,
+    # so the ATA columns are attached with assign instead of extra copies
+    df_filtered = df[keep]
     
-    return df_filtered
+    # Format ATA to xx-xx
+    return df_filtered.assign(
+        ATA_Formatted=format_ata_column(ata_str[keep]),
+        ATA_2Digit=ata_2digit[keep],
+    )
 
 
-def create_timeline_summary(events: List[WorkOrderEvent]) -> str:
-    """Create a timeline summary of events"""
-    summaries = []
-    for event in events:
-        date_str = event.issued_date.strftime('%d/%m') if isinstance(event.issued_date, datetime) else str(event.issued_date)[:5]
-        desc_short = event.description[:50] + '...' if len(str(event.description)) > 50 else event.description
-        action_short = event.action[:30] + '...' if len(str(event.action)) > 30 else event.action
-        type_str = f"[{event.wo_type}]" if event.wo_type else ""
-        summaries.append(f"{date_str} {type_str}: {desc_short} → {action_short}")
-    return "; ".join(summaries)
+def timeline_entry(event: WorkOrderEvent, date: str) -> str:
+    """Format one event of the timeline summary"""
+    desc_short = event.description[:50] + '...' if len(str(event.description)) > 50 else event.description
+    action_short = event.action[:30] + '...' if len(str(event.action)) > 30 else event.action
+    type_str = f"[{event.wo_type}]" if event.wo_type else ""
+    return f"{date[:5]} {type_str}: {desc_short} → {action_short}"
 
 
-def determine_conclusion(events: List[WorkOrderEvent]) -> str:
-    """
-    Determine conclusion based on events:
-    - SINGLE_EVENT: Only 1 WO
-    - RESET_ONLY_REPEAT: ≥2 WO with all RESET_ONLY actions
-    - CORRECTIVE_OK: Has CORRECTIVE and no recurrence after (strictly later date)
-    - CORRECTIVE_NOT_EFFECTIVE: Has CORRECTIVE but recurrence strictly after (later date)
-    """
-    if len(events) == 1:
-        return "SINGLE_EVENT"
-    
-    action_types = [e.action_type for e in events]
-    
-    # Check if all are reset only or unknown (no corrective)
-    has_corrective = any(t == "CORRECTIVE_ACTION" for t in action_types)
-    
-    if not has_corrective:
-        return "RESET_ONLY_REPEAT"
-    
-    # Logic change based on user feedback:
-    # "If same day: warning -> fix (effective)"
-    # Recurrence is only if event date > last corrective action date
-    
-    # Find the LAST corrective action event (by date/order)
-    last_corrective_event = None
-    for e in events:
-        if e.action_type == "CORRECTIVE_ACTION":
-            last_corrective_event = e
-            
-    # Should not happen given has_corrective check, but safety first
-    if not last_corrective_event: 
-        return "RESET_ONLY_REPEAT"
-        
-    last_corrective_date = last_corrective_event.issued_date.date()
-    
-    # Check for any event strictly AFTER the last corrective date
-    for e in events:
-        if e.issued_date.date() > last_corrective_date:
-            return "CORRECTIVE_NOT_EFFECTIVE"
-    
-    return "CORRECTIVE_OK"
+def create_timeline_summary(events: List[WorkOrderEvent], dates: List[str]) -> str:
+    """Create a timeline summary of events (dates pre-formatted as dd/mm/YYYY)"""
+    return "; ".join([timeline_entry(event, date) for event, date in zip(events, dates)])
 
 
 def normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
@@ -346,57 +423,26 @@ def normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
     Normalize column names to standard expected format:
     - ATA, A/C, WO, W/O Action, Issued, W/O Description, ATA Description
     """
-    df.columns = [str(c).strip() for c in df.columns]
-    
-    # Mapping dictionary (lowercase/variation -> standard)
-    column_mapping = {
-        'a/c': 'A/C',
-        'aircraft': 'A/C',
-        'ac': 'A/C',
-        'ata': 'ATA',
-        'ata chapter': 'ATA',
-        'wo': 'WO',
-        'work order': 'WO',
-        'workorder': 'WO',
-        'w/o': 'WO',
-        'w/o action': 'W/O Action',
-        'work order action': 'W/O Action',
-        'action': 'W/O Action',
-        'w/o_action': 'W/O Action',
-        'issued': 'Issued',
-        'issue date': 'Issued',
-        'date issued': 'Issued',
-        'issue_date': 'Issued',
-        'issued_date': 'Issued',
-        'w/o description': 'W/O Description',
-        'work order description': 'W/O Description',
-        'description': 'ATA Description',
-        'w/o_description': 'W/O Description',
-        'desc': 'ATA Description',
-        'type': 'Type',
-        'wo type': 'Type',
-        'work type': 'Type',
-        'wo_type': 'Type',
-        'w/o_type': 'Type',
-        'record_type': 'Type'
-    }
+    names = [str(c).strip() for c in df.columns]
+    
+    # Single pass over the columns. Each standard name goes to the best match:
+    # the name itself, then the name in any case, then the first variation.
+    claimed = {}  # standard -> (column position, match rank)
+    for pos, name in enumerate(names):
+        key = name.casefold()
+        standard = COLUMN_MAPPING.get(key)
+        if standard is None:
+            continue
+        rank = 2 if name == standard else int(key == standard.casefold())
+        previous = claimed.get(standard)
+        if previous is None or rank > previous[1]:
+            claimed[standard] = (pos, rank)
     
-    new_columns = {}
-    for col in df.columns:
-        col_lower = col.lower()
-        if col_lower in column_mapping:
-            standard_col = column_mapping[col_lower]
-            # Prioritize if exact match doesn't exist or overwriting generic 'description'
-            if standard_col not in new_columns:
-                 new_columns[standard_col] = col
-            elif col_lower == 'w/o description': # Priority for specific description
-                 new_columns[standard_col] = col
-                 
-    # Rename columns that were found
-    rename_map = {v: k for k, v in new_columns.items()}
-    df_normalized = df.rename(columns=rename_map)
+    for standard, (pos, _) in claimed.items():
+        names[pos] = standard
     
-    return df_normalized
+    # Relabel positionally on a new frame; the caller's DataFrame is left untouched
+    return df.set_axis(names, axis=1)
 
 
 def normalize_type(type_value: str) -> str:
@@ -412,22 +458,14 @@ def normalize_type(type_value: str) -> str:
     
     type_str = str(type_value).strip().upper()
     
-    # Mapping from full names to abbreviations
-    type_mapping = {
-        'MAINTENANCE DEFECT': 'M',
-        'CABIN DEFECT': 'C',
-        'PILOT REPORT': 'P',
-        'SCHEDULED W/O': 'S',
-        'SCHEDULED': 'S',
-        'SCHEDULE': 'S'
-    }
-    
-    # If already abbreviated (single letter), return as is
-    if len(type_str) == 1 and type_str in ['M', 'C', 'P', 'S']:
-        return type_str
-    
-    # Otherwise, look up in mapping
-    return type_mapping.get(type_str, type_str)
+    # Abbreviations map to themselves; anything unknown is kept as is
+    return TYPE_MAPPING.get(type_str, type_str)
+
+
+def normalize_types(types: pd.Series) -> pd.Series:
+    """Vectorized normalize_type over a whole column, returned as category dtype"""
+    type_str = types.fillna('').astype(str).str.strip().str.upper()
+    return type_str.map(TYPE_MAPPING).fillna(type_str).astype('category')
 
 
 def analyze_work_orders(df: pd.DataFrame, exclude_type_s: bool = False) -> List[AnalysisResult]:
@@ -439,7 +477,7 @@ def analyze_work_orders(df: pd.DataFrame, exclude_type_s: bool = False) -> List[
     
     # Normalize Type values to standard abbreviations (M, C, P, S)
     if 'Type' in df.columns:
-        df['Type'] = df['Type'].apply(normalize_type)
+        df['Type'] = normalize_types(df['Type'])
     
     # Filter Schedule type if requested
     if exclude_type_s and 'Type' in df.columns:
@@ -465,70 +503,108 @@ def analyze_work_orders(df: pd.DataFrame, exclude_type_s: bool = False) -> List[
     
     # Convert Issued to datetime
     df_filtered['Issued_Date'] = pd.to_datetime(df_filtered['Issued'], errors='coerce')
+    # Format dates once for the whole column (empty string when the date is missing)
+    df_filtered['Issued_DDMMYYYY'] = df_filtered['Issued_Date'].dt.strftime('%d/%m/%Y').fillna('')
+    
+    # Stringify the text columns once; the reference scan, classification and
+    # event cleaning below all work from these
+    desc_text = text_column(df_filtered, 'W/O Description')
+    action_text = text_column(df_filtered, 'W/O Action')
     
     # === ATA CORRECTION LOGIC ===
     # Extract corrected ATA from task references in description/action text
     # We now check W/O Description, ATA Description (as fallback) and W/O Action
-    df_filtered['ATA Corrected'] = df_filtered.apply(
-        lambda row: extract_ata_from_text(
-            str(row.get('W/O Description', '')) + " " + str(row.get('ATA Description', '')),
-            row.get('W/O Action', ''),
-            row.get('ATA', '')
-        ),
-        axis=1
-    )
+    reference_text = (
+        desc_text + " " + text_column(df_filtered, 'ATA Description') + " " + action_text
+    ).str.upper()
+    # Rows without a W/O Action keep their original ATA (see extract_ata_from_text)
+    reference_text = reference_text.where(df_filtered['W/O Action'].notna(), "")
+    references = reference_text.map(find_ata_reference)
+    df_filtered['ATA Corrected'] = references.fillna(df_filtered['ATA_Formatted'])
     
     # Create ATA02 column (2-digit ATA from corrected ATA)
-    df_filtered['ATA02'] = df_filtered['ATA Corrected'].apply(get_ata_2digit)
-    
-    # Use corrected ATA for grouping
-    grouped = df_filtered.groupby(['A/C', 'ATA Corrected'])
-
+    df_filtered['ATA02'] = get_ata_2digit_column(ata_text_column(df_filtered['ATA Corrected']))
+    
+    # Classify every W/O Action up front
+    df_filtered['action_type'] = classify_actions(action_text)
+    
+    # Category dtype: grouping hashes integer codes instead of strings
+    # (action_type already comes back as a fixed ACTION_TYPES categorical)
+    for col in ('A/C', 'ATA Corrected', 'ATA02'):
+        df_filtered[col] = df_filtered[col].astype('category')
+    
+    # Build event fields column-wise so the group loop only assembles events.
+    # Best available description: W/O Description, else ATA Description
+    wo_desc = df_filtered['W/O Description'] if 'W/O Description' in df_filtered.columns else pd.Series(None, index=df_filtered.index, dtype=object)
+    ata_desc = df_filtered['ATA Description'] if 'ATA Description' in df_filtered.columns else ''
+    desc_blank = desc_text.str.strip() == ""
+    df_filtered['event_description'] = clean_amos_metadata_column(wo_desc.where(~desc_blank, ata_desc))
+    df_filtered['event_action'] = clean_amos_metadata_column(action_text)
+    df_filtered['event_wo'] = df_filtered['WO'].map(str) if 'WO' in df_filtered.columns else ''
+    # Type is already normalized to M/C/P/S
+    df_filtered['event_type'] = df_filtered['Type'].map(str) if 'Type' in df_filtered.columns else ''
+    event_columns = ['event_wo', 'event_description', 'event_action', 'action_type', 'event_type', 'Issued_Date']
+    
+    # Sort once by issued date (stable) so every group's rows are already chronological
+    df_filtered = df_filtered.sort_values('Issued_Date', kind='stable')
+    event_values = df_filtered[event_columns].to_numpy(dtype=object)
+    date_values = df_filtered['Issued_DDMMYYYY'].to_numpy(dtype=object)
+    
+    # Use corrected ATA for grouping; indices maps each key to its row positions
+    grouped = df_filtered.assign(
+        issued_day=df_filtered['Issued_Date'].dt.normalize(),
+        is_corrective=df_filtered['action_type'] == "CORRECTIVE_ACTION",
+    ).assign(
+        corrective_day=lambda d: d['issued_day'].where(d['is_corrective'])
+    ).groupby(['A/C', 'ATA Corrected'], observed=True)
+    group_indices = grouped.indices
+    
+    # Aggregate every group at once, then derive conclusions:
+    # - SINGLE_EVENT: Only 1 WO
+    # - RESET_ONLY_REPEAT: ≥2 WO with no CORRECTIVE action
+    # - CORRECTIVE_NOT_EFFECTIVE: recurrence strictly after (later day than) the last CORRECTIVE
+    # - CORRECTIVE_OK: otherwise; same-day events and missing dates never count as recurrence
+    summary = grouped.agg(
+        wo_count=('issued_day', 'size'),
+        ata_2digit=('ATA02', 'first'),
+        has_corrective=('is_corrective', 'any'),
+        last_event_day=('issued_day', 'max'),
+        last_corrective_day=('corrective_day', 'max'),
+    )
+    conclusions = np.select(
+        [
+            summary['wo_count'] == 1,
+            ~summary['has_corrective'],
+            summary['last_event_day'] > summary['last_corrective_day'],
+        ],
+        ["SINGLE_EVENT", "RESET_ONLY_REPEAT", "CORRECTIVE_NOT_EFFECTIVE"],
+        default="CORRECTIVE_OK"
+    )
     
-    for (aircraft, ata), group in grouped:
-        # Sort by issued date
-        group_sorted = group.sort_values('Issued_Date')
+    # Per-group values come straight from the aggregate table
+    rows = zip(
+        summary.index,
+        summary['wo_count'].tolist(),
+        summary['ata_2digit'].astype(object).tolist(),  # all rows in a group share ATA02
+        conclusions.tolist(),
+    )
+    for (aircraft, ata), wo_count, ata_2digit, conclusion in rows:
+        idx = group_indices[(aircraft, ata)]
         
         # Create events list
-        events = []
-        for _, row in group_sorted.iterrows():
-            action_type = classify_action(row.get('W/O Action', ''))
-            
-            # Get the best available description for the event
-            wo_desc = row.get('W/O Description')
-            if pd.isna(wo_desc) or str(wo_desc).strip() == "":
-                wo_desc = row.get('ATA Description', '')
-            
-            # Clean AMOS metadata from description and action
-            wo_desc_clean = clean_amos_metadata(wo_desc)
-            wo_action_clean = clean_amos_metadata(row.get('W/O Action', ''))
-                
-            events.append(WorkOrderEvent(
-                wo=str(row.get('WO', '')),
-                description=wo_desc_clean,
-                action=wo_action_clean,
-                action_type=action_type,
-                wo_type=str(row.get('Type', '')),  # Type is already normalized to M/C/P/S
-                issued_date=row['Issued_Date']
-            ))
-        
-        # Determine conclusion
-        conclusion = determine_conclusion(events)
+        events = [WorkOrderEvent(*row) for row in event_values[idx]]
         
         # Create dates list
-        dates = [e.issued_date.strftime('%d/%m/%Y') if pd.notna(e.issued_date) else '' for e in events]
+        dates = date_values[idx].tolist()
         
         # Create timeline summary
-        timeline = create_timeline_summary(events)
-        
-        # Get ATA02 from the group (all rows in group have same ATA02)
-        ata_2digit = group['ATA02'].iloc[0] if 'ATA02' in group.columns else get_ata_2digit(ata)
+        timeline = create_timeline_summary(events, dates)
         
         results.append(AnalysisResult(
             aircraft=str(aircraft),
             ata=str(ata),  # This is now ATA Corrected
             ata_2digit=ata_2digit,
-            wo_count=len(events),
+            wo_count=wo_count,
             conclusion=conclusion,
             dates=dates,
             timeline_summary=timeline,
@@ -540,7 +616,7 @@ def analyze_work_orders(df: pd.DataFrame, exclude_type_s: bool = False) -> List[
 
 def get_red_flags(results: List[AnalysisResult]) -> List[AnalysisResult]:
     """Get only red flag results (RESET_ONLY_REPEAT and CORRECTIVE_NOT_EFFECTIVE)"""
-    return [r for r in results if r.conclusion in ['RESET_ONLY_REPEAT', 'CORRECTIVE_NOT_EFFECTIVE']]
+    return [r for r in results if r.conclusion in RED_FLAG_CONCLUSIONS]
 
 
 def get_first_sentence(text: str) -> str:
@@ -548,26 +624,55 @@ def get_first_sentence(text: str) -> str:
     if pd.isna(text) or not text:
         return ""
     text_str = str(text).strip()
-    match = re.search(r'[^.!?]*[.!?]', text_str)
+    match = FIRST_SENTENCE_PATTERN.search(text_str)
     if match:
         return match.group(0)
     # If no period found, return first 80 chars
     return (text_str[:80] + "...") if len(text_str) > 80 else text_str
 
 
+@lru_cache(maxsize=4096)
+def wo_prefix_pattern(wo_clean: str) -> 're.Pattern':
+    """Compiled pattern for a WO number (optionally bracketed) plus separators at text start"""
+    return re.compile(rf'^\[?{re.escape(wo_clean)}\]?\s*[:;\-\s]*', re.IGNORECASE)
+
+
 def clean_wo_from_text(text: str, wo: str) -> str:
     """Remove WO number and common separators from the start of the text."""
     if not text or not wo:
         return text
-    wo_clean = str(wo).strip()
     # Match WO at start (with or without brackets) followed by optional separators
-    pattern = rf'^\[?{re.escape(wo_clean)}\]?\s*[:;\-\s]*'
-    cleaned = re.sub(pattern, '', str(text).strip(), flags=re.IGNORECASE)
+    cleaned = wo_prefix_pattern(str(wo).strip()).sub('', str(text).strip())
     # Also handle some extra junk that might remain like "; " at start
-    cleaned = re.sub(r'^[:;\-\s]+', '', cleaned)
+    cleaned = LEADING_SEPARATORS_PATTERN.sub('', cleaned)
     return cleaned
 
 
+def history_entry(e: WorkOrderEvent, date: str) -> Tuple[str, str]:
+    """Format one event of the recommendation history as (html, plain) lines (date as dd/mm/YYYY)"""
+    date_str = date[:5] or "N/A"
+    
+    # Clean WO duplication from text
+    clean_desc = clean_wo_from_text(e.description, e.wo)
+    clean_action = clean_wo_from_text(e.action, e.wo)
+    
+    # Extract first sentences
+    desc_short = get_first_sentence(clean_desc).replace('\n', ' ')
+    action_short = get_first_sentence(clean_action).replace('\n', ' ')
+    
+    wo_info = f"[{e.wo}]" if e.wo else ""
+    type_info = f"[{e.wo_type}]" if e.wo_type else ""
+    type_info_html = type_info
+    
+    if e.wo_type == 'P':  # Highlight pilot reports
+        type_info_html = f"<span style='color:#ef4444; font-weight:bold;'>[{e.wo_type}]</span>"
+        
+    # Format: - Date [Type]: [WO] Description -> Action
+    line_html = f"- **{date_str}** {type_info_html}: {wo_info} {desc_short} &rarr; {action_short}"
+    line_plain = f"- {date_str} {type_info}: {wo_info} {desc_short} -> {action_short}"
+    return line_html, line_plain
+
+
 def generate_recommendation(result: AnalysisResult) -> dict:
     """
     Generate detailed technical recommendation with structured data.
@@ -580,47 +685,31 @@ def generate_recommendation(result: AnalysisResult) -> dict:
         'full_html': str (for card display)
     }
     """
+    # The UI re-renders the same results on every rerun: memoize on their content
+    event_fields = tuple(
+        (e.wo, e.description, e.action, e.action_type, e.wo_type, e.issued_date)
+        for e in result.events
+    )
+    return dict(cached_recommendation(result.conclusion, result.ata, event_fields, tuple(result.dates)))
+
+
+@lru_cache(maxsize=4096)
+def cached_recommendation(conclusion: str, ata: str, event_fields: Tuple[tuple, ...], dates: Tuple[str, ...]) -> dict:
+    """Memoized body of generate_recommendation (the returned dict is shared: copy before mutating)"""
+    events = [WorkOrderEvent(*fields) for fields in event_fields]
     
     # 1. Summary of history (Dates + WO + Desc + Action)
-    history_lines_html = []
-    history_lines_plain = []
-    pilot_reports = 0
-    
-    for e in result.events:
-        date_str = e.issued_date.strftime('%d/%m') if pd.notna(e.issued_date) else "N/A"
-        
-        # Clean WO duplication from text
-        clean_desc = clean_wo_from_text(e.description, e.wo)
-        clean_action = clean_wo_from_text(e.action, e.wo)
-        
-        # Extract first sentences
-        desc_short = get_first_sentence(clean_desc).replace('\n', ' ')
-        action_short = get_first_sentence(clean_action).replace('\n', ' ')
-        
-        wo_info = f"[{e.wo}]" if e.wo else ""
-        type_info = f"[{e.wo_type}]" if e.wo_type else ""
-        type_info_html = type_info
-        
-        if e.wo_type == 'P':  # Count pilot reports (now using normalized type)
-            pilot_reports += 1
-            type_info_html = f"<span style='color:#ef4444; font-weight:bold;'>[{e.wo_type}]</span>"
-            
-        # Format: - Date [Type]: [WO] Description -> Action
-        line_html = f"- **{date_str}** {type_info_html}: {wo_info} {desc_short} &rarr; {action_short}"
-        line_plain = f"- {date_str} {type_info}: {wo_info} {desc_short} -> {action_short}"
-        
-        history_lines_html.append(line_html)
-        history_lines_plain.append(line_plain)
-        
-    history_text_html = "<br>".join(history_lines_html)
-    history_text_plain = "\n".join(history_lines_plain)
+    history_lines = [history_entry(e, date) for e, date in zip(events, dates)]
+    history_text_html = "<br>".join([line_html for line_html, _ in history_lines])
+    history_text_plain = "\n".join([line_plain for _, line_plain in history_lines])
+    pilot_reports = sum(e.wo_type == 'P' for e in events)  # Pilot reports (normalized type)
     
     # 2. Determine severity and recommendation
     assessment_text = ""
     recommendation_text = ""
     is_severe = pilot_reports >= 2  # Criterion for severe warning
     
-    if result.conclusion == "RESET_ONLY_REPEAT":
+    if conclusion == "RESET_ONLY_REPEAT":
         assessment_text = "Hỏng hóc lặp lại với biện pháp xử lý chủ yếu là reset/ops test."
         if is_severe:
             recommendation_text = (
@@ -635,7 +724,7 @@ def generate_recommendation(result: AnalysisResult) -> dict:
                 f"và xem xét thay thế vật tư dự phòng (proactive replacement) để cắt đứt chuỗi hỏng hóc."
             )
             
-    elif result.conclusion == "CORRECTIVE_NOT_EFFECTIVE":
+    elif conclusion == "CORRECTIVE_NOT_EFFECTIVE":
         assessment_text = "Đã có biện pháp Corrective nhưng vẫn tái phát."
         if is_severe:
             recommendation_text = (
@@ -656,7 +745,7 @@ def generate_recommendation(result: AnalysisResult) -> dict:
     final_content_html = (
         f"**Diễn biến hỏng hóc:**<br>"
         f"{history_text_html}<br><br>"
-        f"**Đánh giá:** ATA {result.ata} {assessment_text}<br>"
+        f"**Đánh giá:** ATA {ata} {assessment_text}<br>"
         f"**Khuyến cáo:**<br>{recommendation_html}"
     )
     
@@ -676,29 +765,18 @@ def create_tic_tac_matrix(results: List[AnalysisResult]) -> pd.DataFrame:
     if not red_flags:
         return pd.DataFrame()
     
-    # Get unique aircraft and ATA 2-digit codes
-    aircraft_list = sorted(set(r.aircraft for r in red_flags))
-    ata_list = sorted(set(r.ata_2digit for r in red_flags))
-    
-    # Create matrix
-    matrix_data = {}
-    for aircraft in aircraft_list:
-        row = {}
-        for ata in ata_list:
-            # Find matching result
-            matching = [r for r in red_flags if r.aircraft == aircraft and r.ata_2digit == ata]
-            if matching:
-                # Use emoji indicators
-                conclusions = set(m.conclusion for m in matching)
-                if 'CORRECTIVE_NOT_EFFECTIVE' in conclusions:
-                    row[f"ATA {ata}"] = "🔴"  # More severe
-                else:
-                    row[f"ATA {ata}"] = "🟠"  # RESET_ONLY_REPEAT
-            else:
-                row[f"ATA {ata}"] = ""
-        matrix_data[aircraft] = row
-    
-    df_matrix = pd.DataFrame(matrix_data).T
+    # One cell per A/C + ATA 2-digit: red if any result there is CORRECTIVE_NOT_EFFECTIVE
+    flags = pd.DataFrame({
+        'aircraft': [r.aircraft for r in red_flags],
+        'ata_2digit': [r.ata_2digit for r in red_flags],
+        'not_effective': [r.conclusion == 'CORRECTIVE_NOT_EFFECTIVE' for r in red_flags],
+    })
+    severe = flags.groupby(['aircraft', 'ata_2digit'])['not_effective'].any()
+    
+    # Use emoji indicators: 🔴 more severe, 🟠 RESET_ONLY_REPEAT
+    indicators = pd.Series(np.where(severe, "🔴", "🟠").tolist(), index=severe.index)
+    df_matrix = indicators.unstack(fill_value="")
+    df_matrix.columns = [f"ATA {ata}" for ata in df_matrix.columns]
     df_matrix.index.name = "A/C"
     
     return df_matrix
@@ -706,18 +784,19 @@ def create_tic_tac_matrix(results: List[AnalysisResult]) -> pd.DataFrame:
 
 def results_to_dataframe(results: List[AnalysisResult]) -> pd.DataFrame:
     """Convert analysis results to a DataFrame for display/export"""
-    data = []
-    for r in results:
-        data.append({
-            'A/C': r.aircraft,
-            'ATA': r.ata,
-            'Ngày xảy ra': ', '.join(r.dates),
-            'Số WO': r.wo_count,
-            'Kết luận': r.conclusion,
-            'Tóm tắt tình trạng': r.timeline_summary
-        })
-    
-    return pd.DataFrame(data)
+    df = pd.DataFrame.from_records(
+        (
+            (r.aircraft, r.ata, ', '.join(r.dates), r.wo_count, r.conclusion, r.timeline_summary)
+            for r in results
+        ),
+        columns=SUMMARY_COLUMNS,
+        nrows=len(results)
+    )
+    if df.empty:
+        # from_records drops the labels for an empty iterator on older pandas
+        df = pd.DataFrame(columns=SUMMARY_COLUMNS)
+    df['Kết luận'] = pd.Categorical(df['Kết luận'], categories=CONCLUSIONS)
+    return df
 
 
 def get_conclusion_display(conclusion: str) -> Tuple[str, str]:
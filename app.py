@@ -5,20 +5,26 @@ Streamlit web application for analyzing Work Orders from AMOS system
 
 import os
 import json
+import html
+import hashlib
+import importlib.util
+import threading
 from datetime import datetime
 import streamlit as st
+import numpy as np
 import pandas as pd
+from pandas.io.parsers import TextParser
 from io import BytesIO
-import requests
+from concurrent.futures import ThreadPoolExecutor
 import streamlit_authenticator as stauth
+import analysis
 from analysis import (
     analyze_work_orders,
-    get_red_flags,
     generate_recommendation,
     create_tic_tac_matrix,
     results_to_dataframe,
     get_conclusion_display,
-    filter_data
+    RED_FLAG_CONCLUSIONS
 )
 
 # Page configuration
@@ -41,7 +47,7 @@ credentials = {
 }
 
 # IMPORTANT: You need to hash passwords for streamlit-authenticator
-# You can generate a hash using: stauth.Hasher(['vna1234']).generate()
+# You can generate a hash by running generate_password_hash.py
 # For this demo, let's use a simpler dictionary structure for stauth < 0.3.0 or update accordingly
 # Let's use the standard configuration format for the latest version
 
@@ -53,7 +59,7 @@ authenticator = stauth.Authenticate(
 )
 
 # UI/UX Pro Max - Premium Design System (CSS)
-st.markdown("""
+APP_CSS = """
 <style>
     /* Global Settings */
     @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap');
@@ -193,8 +199,39 @@ st.markdown("""
     }
     /* Add styling for connection status */
     .stStatusWidget {visibility: hidden;}
+
+    /* Event detail table (drill-down in the matrix view) */
+    .detail-table {
+        width: 100%;
+        border-collapse: collapse;
+        color: #e2e8f0;
+        font-size: 0.9rem;
+        margin-bottom: 20px;
+    }
+    .detail-table th {
+        background-color: #334155;
+        padding: 12px 10px;
+        text-align: left;
+        border: 1px solid #475569;
+        font-weight: 600;
+    }
+    .detail-table td {
+        background-color: rgba(30, 41, 59, 0.4);
+        padding: 10px;
+        border: 1px solid #475569;
+        vertical-align: top;
+        white-space: pre-wrap; /* Text wrapping */
+        word-wrap: break-word;
+        line-height: 1.5;
+    }
+    .detail-table tr:hover td {
+        background-color: rgba(51, 65, 85, 0.6);
+    }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+# Streamlit drops page markup between reruns, so the CSS is emitted on every run
+st.markdown(APP_CSS, unsafe_allow_html=True)
 
 
 def create_metric_card(value, label, icon="📊", color="blue"):
@@ -209,20 +246,72 @@ def create_metric_card(value, label, icon="📊", color="blue"):
     </div>
     """
 
+# Icon prefixed to the Kết luận column in the detail table (same icons as get_conclusion_display)
+CONCLUSION_ICONS = {
+    'CORRECTIVE_NOT_EFFECTIVE': '🔴',
+    'RESET_ONLY_REPEAT': '⚠️',
+    'CORRECTIVE_OK': '✅',
+    'SINGLE_EVENT': '📋',
+}
+
 # --- COMMENT SYSTEM & GOOGLE SHEETS SYNC (VIA APPS SCRIPT) ---
 COMMENTS_FILE = "technical_comments.csv"
+COMMENT_COLUMNS = ['ID', 'Aircraft', 'ATA', 'History', 'Assessment', 'Recommendation', 'Comment', 'Timestamp', 'User']
 DEFAULT_APPS_SCRIPT_URL = "https://script.google.com/macros/s/AKfycbwzhSN-4xqbovzj5q3zzx1vNR3X8nH4Fra60M78bZP66ea-gL1phwIDztz08eGA2TuEUA/exec"
 
+@st.cache_data(show_spinner=False, max_entries=4)
+def read_comments_file(file_stamp):
+    """Parse the comments CSV (cached per file stamp: mtime in ns and size)"""
+    # Every field is text: skip dtype inference and keep empty cells as ''
+    return pd.read_csv(COMMENTS_FILE, dtype=str, keep_default_na=False)
+
+def comments_file_stamp():
+    """(mtime_ns, size) of the comments CSV, or None if it does not exist"""
+    try:
+        stat = os.stat(COMMENTS_FILE)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+@st.cache_resource
+def get_saved_comments():
+    """Rows save_comment last wrote, with the file stamp they produced (shared across sessions)"""
+    return {'latest': (None, None)}
+
 def load_comments():
     """Load comments from local CSV"""
-    if os.path.exists(COMMENTS_FILE):
-        return pd.read_csv(COMMENTS_FILE)
-    return pd.DataFrame(columns=['ID', 'Aircraft', 'ATA', 'History', 'Assessment', 'Recommendation', 'Comment', 'Timestamp', 'User'])
+    file_stamp = comments_file_stamp()
+    if file_stamp is not None:
+        saved_stamp, saved_frame = get_saved_comments()['latest']
+        if saved_stamp == file_stamp:
+            return saved_frame  # Just written by save_comment: no need to parse it back
+        return read_comments_file(file_stamp)
+    return pd.DataFrame(columns=COMMENT_COLUMNS)
+
+def comment_payload(row):
+    """Apps Script payload for a comment row (lower-cased column names as keys)"""
+    return {column.lower(): row.get(column, '') for column in COMMENT_COLUMNS}
+
+SYNC_TIMEOUT = (3, 10)  # (connect, read) seconds
+
+@st.cache_resource
+def get_http_session():
+    """Keep-alive HTTP session reused by every sync (one TLS handshake per connection, not per save)"""
+    # Imported here: requests is only needed once a comment is synced, not on every cold start
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    session = requests.Session()
+    # POST is not in urllib3's default allowed_methods: only failed connections (request never sent)
+    # are retried, so a save that timed out or got a 5xx is not posted twice
+    retries = Retry(total=2, backoff_factor=0.3)
+    session.mount('https://', HTTPAdapter(pool_connections=2, pool_maxsize=4, max_retries=retries))
+    return session
 
 def sync_to_google_sheet(api_url, data_payload):
     """Send data to Google Apps Script Web App"""
     try:
-        response = requests.post(api_url, json=data_payload)
+        response = get_http_session().post(api_url, json=data_payload, timeout=SYNC_TIMEOUT)
         if response.status_code == 200:
             return True, "Synced success"
         else:
@@ -230,9 +319,65 @@ def sync_to_google_sheet(api_url, data_payload):
     except Exception as e:
         return False, f"Sync Error: {str(e)}"
 
+@st.cache_resource
+def get_sync_executor():
+    """Background workers for Google Sheet sync (shared across reruns and sessions)"""
+    return ThreadPoolExecutor(max_workers=4)
+
+@st.cache_resource
+def get_sync_queue():
+    """Latest not-yet-sent payload (and its pending future) per (sheet URL, comment ID)"""
+    return {'lock': threading.Lock(), 'payloads': {}, 'futures': {}}
+
+def send_queued_sync(queue, key):
+    """Worker job: send the newest payload queued for key"""
+    with queue['lock']:
+        payload = queue['payloads'].pop(key)
+    return sync_to_google_sheet(key[0], payload)
+
+def queue_sync(sheet_url, payload):
+    """Queue a sheet sync; saves of the same comment before it is sent collapse into one POST"""
+    queue = get_sync_queue()
+    key = (sheet_url, payload['id'])
+    with queue['lock']:
+        # Forget finished sends (their sessions already hold the futures they track)
+        for done_key in [k for k, future in queue['futures'].items() if future.done()]:
+            del queue['futures'][done_key]
+        already_queued = key in queue['payloads']
+        queue['payloads'][key] = payload
+        if not already_queued:
+            queue['futures'][key] = get_sync_executor().submit(send_queued_sync, queue, key)
+        return queue['futures'][key]
+
+def report_pending_syncs():
+    """Show the outcome of background syncs that finished since the last rerun"""
+    pending = st.session_state.get('pending_syncs', [])
+    for aircraft, ata, future in pending:
+        if future.done():
+            success, msg = future.result()
+            if success:
+                st.toast(f"☁️ {aircraft} / {ata}: Đã sync Google Sheet")
+            else:
+                st.toast(f"⚠️ {aircraft} / {ata}: Lỗi Sync: {msg}")
+    st.session_state['pending_syncs'] = [item for item in pending if not item[2].done()]
+
+def track_sync(aircraft, ata, future):
+    """Remember a queued sync so report_pending_syncs can show its outcome"""
+    pending = st.session_state.setdefault('pending_syncs', [])
+    if all(item[2] is not future for item in pending):
+        pending.append((aircraft, ata, future))
+
+def sync_all_comments(sheet_url):
+    """Queue every locally saved comment for sheet sync (e.g. after failed syncs); returns the count"""
+    rows = [row for row in load_comments().to_dict('records') if row.get('ID')]
+    for row in rows:
+        track_sync(row['Aircraft'], row['ATA'], queue_sync(sheet_url, comment_payload(row)))
+    return len(rows)
+
 def save_comment(result, rec_data, comment, user="Engineer", sheet_url=None):
     """Save comment to local CSV and optional Google Sheet via Web App"""
-    df = load_comments()
+    comments = load_comments()
+    rows = comments.to_dict('records')
     
     aircraft = result.aircraft
     ata = result.ata
@@ -257,49 +402,85 @@ def save_comment(result, rec_data, comment, user="Engineer", sheet_url=None):
         'User': user
     }
     
-    mask = (df['ID'] == unique_id)
-    if mask.any():
-        for key, val in row_data.items():
-            df.loc[mask, key] = val
-    else:
-        new_row = pd.DataFrame([row_data])
-        df = pd.concat([df, new_row], ignore_index=True)
+    # Upsert on plain dicts: no DataFrame reallocation or dtype coercion per save
+    matches = [row for row in rows if row.get('ID') == unique_id]
+    for row in matches:
+        row.update(row_data)
+    if not matches:
+        rows.append(row_data)
+    saved = pd.DataFrame(rows)
     
-    df.to_csv(COMMENTS_FILE, index=False)
+    if not matches and os.path.exists(COMMENTS_FILE) and list(comments.columns) == list(row_data):
+        # New comment: append one line instead of rewriting the file
+        saved.tail(1).to_csv(COMMENTS_FILE, mode='a', header=False, index=False)
+    else:
+        # Write a temp file and swap it in, so a crash never leaves a truncated CSV
+        tmp_file = COMMENTS_FILE + '.tmp'
+        saved.to_csv(tmp_file, index=False)
+        os.replace(tmp_file, COMMENTS_FILE)
+    # Keep the saved rows under the new stamp, so the next rerun does not parse
+    # the CSV it just wrote (missing cells read back as '')
+    get_saved_comments()['latest'] = (comments_file_stamp(), saved.fillna(''))
     
     # Sync to Google Sheet if connected
     if sheet_url:
-        payload = {
-            "id": unique_id,
-            "aircraft": aircraft,
-            "ata": ata,
-            "history": history,
-            "assessment": assessment,
-            "recommendation": recommendation,
-            "comment": comment,
-            "timestamp": timestamp,
-            "user": user
-        }
-        success, msg = sync_to_google_sheet(sheet_url, payload)
-        if success:
-            return True, "✅ Đã lưu Local & Google Sheet!"
-        else:
-            return True, f"✅ Đã lưu Local. ⚠️ Lỗi Sync: {msg}"
+        # Apps Script round-trips take seconds: sync in the background, report on a later rerun
+        track_sync(aircraft, ata, queue_sync(sheet_url, comment_payload(row_data)))
+        return True, "✅ Đã lưu Local. ⏳ Đang sync Google Sheet..."
             
     return True, "✅ Đã lưu Local CSV!"
 
-def get_comment_text(aircraft, ata):
-    """Get specific comment text"""
+@st.cache_data(show_spinner=False, max_entries=4)
+def build_comment_index(file_stamp):
+    """Map comment ID (aircraft_ata) to comment text (cached per comments file stamp)"""
     df = load_comments()
     # Support both old format (Aircraft, ATA) and new format (ID)
     if 'ID' in df.columns:
-         mask = (df['ID'] == f"{aircraft}_{ata}")
+        ids = df['ID'].astype(str)
     else:
-         mask = (df['Aircraft'] == aircraft) & (df['ATA'] == ata)
-         
-    if mask.any():
-        return df.loc[mask, 'Comment'].values[0]
-    return ""
+        ids = df['Aircraft'].astype(str) + '_' + df['ATA'].astype(str)
+    comments = df['Comment'].astype(object).where(df['Comment'].notna(), '')
+    # Keep the first row per ID, as the old per-row lookup did
+    return dict(zip(ids[::-1], comments[::-1]))
+
+def load_comment_index():
+    """Map comment ID (aircraft_ata) to comment text"""
+    file_stamp = comments_file_stamp()
+    if file_stamp is None:
+        return {}
+    return build_comment_index(file_stamp)
+
+def get_comment_text(aircraft, ata):
+    """Get specific comment text"""
+    return load_comment_index().get(f"{aircraft}_{ata}", "")
+
+DETAIL_TABLE_HEADERS = ["Ngày", "Số WO", "Type", "ATA", "Mô tả (Description)", "Hành động (Action)"]
+
+def create_event_table_html(result):
+    """Return the drill-down HTML table of a result's events (cell text escaped)"""
+    def cell(value):
+        return "" if pd.isna(value) else html.escape(str(value))
+    
+    header = "".join(f"<th>{name}</th>" for name in DETAIL_TABLE_HEADERS)
+    rows = "".join(
+        f"<tr><td>{date}</td><td>{cell(e.wo)}</td><td>{cell(e.wo_type)}</td><td>{cell(result.ata)}</td>"
+        f"<td>{cell(e.description)}</td><td>{cell(e.action)}</td></tr>"
+        for e, date in zip(result.events, result.dates)
+    )
+    return f'<table class="detail-table"><thead><tr>{header}</tr></thead><tbody>{rows}</tbody></table>'
+
+# Detail views picked below the metrics (only the selected one is rendered)
+DETAIL_VIEWS = ["🔴 Cảnh báo & Khuyến cáo", "📉 Ma trận Tổng quan", "📋 Dữ liệu chi tiết"]
+
+# Longer event chains go to the virtualized st.dataframe grid instead of a markdown HTML table
+DETAIL_TABLE_HTML_MAX_ROWS = 50
+
+def create_event_table_df(result):
+    """Return the drill-down events of a result as a DataFrame (columns as in the HTML table)"""
+    return pd.DataFrame(
+        [(date, e.wo, e.wo_type, result.ata, e.description, e.action) for e, date in zip(result.events, result.dates)],
+        columns=DETAIL_TABLE_HEADERS
+    )
 
 def create_recommendation_card_html(result, rec_data):
     """Return HTML string for recommendation card"""
@@ -317,65 +498,127 @@ def create_recommendation_card_html(result, rec_data):
     """
 
 
+# Rust-based calamine parses xlsx several times faster than openpyxl; pandas only
+# accepts engine='calamine' from 2.2, so older pandas keeps its default (openpyxl)
+PANDAS_HAS_CALAMINE = tuple(int(part) for part in pd.__version__.split('.')[:2]) >= (2, 2)
+EXCEL_ENGINE = 'calamine' if PANDAS_HAS_CALAMINE and importlib.util.find_spec('python_calamine') else None
+
+# Expected column names (can be variations)
+EXPECTED_COLUMNS = frozenset(['ATA', 'Description', 'Type', 'A/C', 'WO', 'W/O Description',
+                              'W/O Action', 'Issue date', 'Close Date', 'Child_WO'])
+
+def frame_from_rows(rows, header_row):
+    """Build the DataFrame read_excel(header=header_row) would return from raw sheet rows"""
+    if not rows:
+        return pd.DataFrame()  # Empty sheet, as read_excel returns it
+    # Same parser read_excel uses internally: column naming, NA handling and dtype inference match
+    return TextParser(rows, header=header_row, skip_blank_lines=False).read()
+
 @st.cache_data
-def load_data(file):
-    """Load Excel data with caching and header detection"""
-    # Expected column names (can be variations)
-    expected_columns = ['ATA', 'Description', 'Type', 'A/C', 'WO', 'W/O Description', 
-                       'W/O Action', 'Issue date', 'Close Date', 'Child_WO']
-    
-    # First, try reading with default header (row 0)
-    df = pd.read_excel(file)
-    
-    # Check if first row contains the expected headers
-    first_row_columns = [str(col).strip() for col in df.columns]
+def load_data(file_hash, _file):
+    """Load Excel data with caching (keyed by file_hash, the upload's digest) and header detection"""
+    # Parse the workbook once without a header; the header row is then picked in memory
+    raw = pd.read_excel(_file, header=None, dtype=object, engine=EXCEL_ENGINE)
+    rows = raw.astype(object).where(raw.notna(), '').values.tolist()
     
-    # Check if any of the expected columns are in the first row
-    matches = sum(1 for col in expected_columns if col in first_row_columns)
+    # Use the first of row 0 / row 1 holding at least 5 expected column names as header
+    for header_row in (0, 1):
+        if header_row < len(rows):
+            matches = len(EXPECTED_COLUMNS.intersection(str(val).strip() for val in rows[header_row]))
+            if matches >= 5:
+                return frame_from_rows(rows, header_row)
     
-    # If we have at least 5 matches, assume first row is header
-    if matches >= 5:
-        return df
-    
-    # Otherwise, check if second row might be the header
-    # Read again without header to check the second row
-    df_no_header = pd.read_excel(file, header=None)
-    
-    if len(df_no_header) > 1:
-        # Check second row (index 1)
-        second_row = df_no_header.iloc[1].tolist()
-        second_row_str = [str(val).strip() for val in second_row]
-        
-        # Check if second row contains expected columns
-        second_matches = sum(1 for col in expected_columns if col in second_row_str)
-        
-        # If second row has more matches, use it as header
-        if second_matches >= 5:
-            # Read again with second row as header (skiprows=1, header=0)
-            df = pd.read_excel(file, header=1)
-            return df
-    
-    # If neither works well, return the original dataframe
-    return df
+    # If neither works well, use the first row as header
+    return frame_from_rows(rows, 0)
 
-# Removed cache for analysis to ensure code updates (like new recommendation logic) are applied immediately
-def run_analysis(df, exclude_s):
-    """Run analysis (Caching disabled for development iterations)"""
-    return analyze_work_orders(df, exclude_type_s=exclude_s)
+# Part of every analysis cache key: a hash of the analysis.py source, so any edit to the
+# analysis code invalidates cached results automatically (and a checkout or touch alone does not)
+with open(analysis.__file__, 'rb') as analysis_source:
+    ANALYSIS_VERSION = hashlib.md5(analysis_source.read()).hexdigest()
 
-def render_guide_page():
-    """Render the User Guide page with glassmorphism styling"""
-    
-    st.markdown("""
+@st.cache_data(show_spinner="Đang phân tích...")
+def run_analysis(file_hash, _df, exclude_s, version):
+    """Run analysis, cached per uploaded file content and analysis.py version (_df is not hashed: file_hash identifies it)"""
+    return analyze_work_orders(_df, exclude_type_s=exclude_s)
+
+def write_sheet_rows(workbook, sheet_name, df, header_format):
+    """Write df to a new worksheet row by row (required by xlsxwriter's constant_memory mode)"""
+    worksheet = workbook.add_worksheet(sheet_name)
+    worksheet.write_row(0, 0, [str(col) for col in df.columns], header_format)
+    values = df.astype(object).where(df.notna(), None)  # Python scalars; missing cells stay blank
+    for row_idx, row in enumerate(values.itertuples(index=False, name=None), start=1):
+        worksheet.write_row(row_idx, 0, row)
+
+def results_frame(results):
+    """Flat view of the analysis results (one column per attribute) for filters and metrics"""
+    return pd.DataFrame({
+        'aircraft': [r.aircraft for r in results],
+        'ata_2digit': [r.ata_2digit for r in results],
+        'conclusion': [r.conclusion for r in results],
+        'wo_count': [r.wo_count for r in results],
+    })
+
+@st.cache_data(max_entries=16)
+def build_matrix(view_key, _results):
+    """A/C vs ATA matrix of a filtered view (view_key identifies _results, which is not hashed)"""
+    return create_tic_tac_matrix(_results)
+
+@st.cache_data(max_entries=16)
+def build_summary_table(view_key, _results):
+    """Detail table of a filtered view (view_key identifies _results, which is not hashed)"""
+    return results_to_dataframe(_results)
+
+TABLE_PAGE_SIZES = [100, 250, 500, 1000]  # Rows sent to the browser per page of the detail table
+TABLE_PAGE_SIZE = 500  # Default page size
+CARD_PAGE_SIZE = 20  # Recommendation cards per page in the warnings view
+
+def table_page_size(row_count, key):
+    """Rows per page picked in a selector kept in session_state (only shown when the table can span pages)"""
+    st.session_state.setdefault(key, TABLE_PAGE_SIZE)
+    if row_count <= TABLE_PAGE_SIZES[0]:
+        return st.session_state[key]
+    return st.selectbox("Số dòng/trang", TABLE_PAGE_SIZES, key=key)
+
+def page_slice(item_count, key, page_size):
+    """Slice of the page picked in a page selector (only shown when the items span several pages)"""
+    page_count = max(1, -(-item_count // page_size))
+    if page_count == 1:
+        return slice(0, item_count)
+    # The page survives reruns under its widget key (seeded here, so the widget takes no default);
+    # clamp it when filters or a larger page size shrink the page count
+    st.session_state.setdefault(key, 1)
+    if st.session_state[key] > page_count:
+        st.session_state[key] = page_count
+    page = st.number_input(f"Trang (1-{page_count}, {page_size} mục/trang)", min_value=1, max_value=page_count, step=1, key=key)
+    start = (page - 1) * page_size
+    return slice(start, start + page_size)
+
+@st.cache_data(max_entries=16)
+def build_excel_report(report_key, _summary_df, _red_flags, _recommendations):
+    """Excel report bytes, cached per report_key (file hash, analysis options and filters)"""
+    output = BytesIO()
+    # constant_memory flushes each row as it is written instead of holding the whole workbook
+    options = {'constant_memory': True, 'strings_to_urls': False}
+    with pd.ExcelWriter(output, engine='xlsxwriter', engine_kwargs={'options': options}) as writer:
+        header_format = writer.book.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+        write_sheet_rows(writer.book, 'All Data', _summary_df, header_format)
+        if _red_flags:
+            rf_df = results_to_dataframe(_red_flags)
+            rf_df['Khuyến cáo'] = [_recommendations[(r.aircraft, r.ata)].get('full_html', '') for r in _red_flags]
+            write_sheet_rows(writer.book, 'Warnings', rf_df, header_format)
+    return output.getvalue()
+
+# User guide page: header and (expander title, expanded, body) sections
+GUIDE_HEADER_HTML = """
     <div style="text-align: center; margin-bottom: 30px;">
         <h1 style="color: #f1f5f9;">📖 Hướng dẫn sử dụng</h1>
         <p style="color: #94a3b8; font-size: 1.1rem;">Công cụ phân tích Hỏng hóc — Technical Department, Vietnam Airlines</p>
     </div>
-    """, unsafe_allow_html=True)
+    """
 
-    # --- Section 1: Quick Start ---
-    with st.expander("🚀 **Bắt đầu nhanh**", expanded=True):
-        st.markdown("""
+GUIDE_SECTIONS = (
+    # Section 1: Quick Start
+    ("🚀 **Bắt đầu nhanh**", True, """
 <div class="glass-card">
 <h3 style="color:#60a5fa; margin-top:0;">Bước 1: Đăng nhập</h3>
 <p style="color:#cbd5e1;">Nhập <b>Username</b> và <b>Password</b> được cấp bởi Technical Department. Nếu chưa có tài khoản, liên hệ bộ phận kỹ thuật.</p>
@@ -406,11 +649,9 @@ def render_guide_page():
 </table>
 <p style="color:#94a3b8; font-size:0.9rem;">💡 <b>Lưu ý:</b> Hệ thống tự động nhận diện hàng tiêu đề (header) ở dòng 1 hoặc dòng 2 trong file Excel. Nếu file có tiêu đề phụ ở dòng đầu, hệ thống sẽ tự bỏ qua.</p>
 </div>
-        """, unsafe_allow_html=True)
-
-    # --- Section 2: Analysis Options ---
-    with st.expander("⚙️ **Tùy chọn phân tích**"):
-        st.markdown("""
+        """),
+    # Section 2: Analysis Options
+    ("⚙️ **Tùy chọn phân tích**", False, """
 <div class="glass-card">
 <h3 style="color:#fbbf24; margin-top:0;">Bỏ Type 'S' (Scheduled Work Order)</h3>
 <p style="color:#cbd5e1;">Khi <b>bật</b> toggle <i>"Chỉ phân tích Hỏng hóc"</i>, hệ thống sẽ loại bỏ các dòng có Type = <code>S</code> (Scheduled / Lịch bảo dưỡng định kỳ), chỉ giữ lại các loại:</p>
@@ -422,13 +663,11 @@ def render_guide_page():
 <p style="color:#94a3b8; font-size:0.9rem;">👉 Nên <b>bật</b> để tập trung vào hỏng hóc thực sự.</p>
 
 <h3 style="color:#fbbf24;">Google Sheet Sync</h3>
-<p style="color:#cbd5e1;">Bật <b>"Kết nối Google Sheet"</b> để đồng bộ ghi chú kỹ thuật lên Google Sheet chung, giúp team cùng theo dõi. Link Apps Script đã được cấu hình sẵn.</p>
+<p style="color:#cbd5e1;">Bật <b>"Kết nối Google Sheet"</b> để đồng bộ ghi chú kỹ thuật lên Google Sheet chung, giúp team cùng theo dõi. Link Apps Script đã được cấu hình sẵn. Nếu sync bị lỗi, bấm <b>"🔄 Sync toàn bộ ghi chú"</b> để gửi lại tất cả ghi chú đã lưu local.</p>
 </div>
-        """, unsafe_allow_html=True)
-
-    # --- Section 3: Dashboard & Metrics ---
-    with st.expander("📊 **Dashboard & Metrics**"):
-        st.markdown("""
+        """),
+    # Section 3: Dashboard & Metrics
+    ("📊 **Dashboard & Metrics**", False, """
 <div class="glass-card">
 <h3 style="color:#34d399; margin-top:0;">4 Thẻ chỉ số (Metrics)</h3>
 <table style="width:100%; color:#cbd5e1; border-collapse:collapse; margin:10px 0;">
@@ -469,11 +708,9 @@ def render_guide_page():
     <td style="padding:8px; border:1px solid #475569;">Chỉ có 1 WO, đang theo dõi</td></tr>
 </table>
 </div>
-        """, unsafe_allow_html=True)
-
-    # --- Section 4: Warnings Tab ---
-    with st.expander("🔴 **Tab: Cảnh báo & Khuyến cáo**"):
-        st.markdown("""
+        """),
+    # Section 4: Warnings Tab
+    ("🔴 **Tab: Cảnh báo & Khuyến cáo**", False, """
 <div class="glass-card">
 <h3 style="color:#f87171; margin-top:0;">Card Khuyến cáo</h3>
 <p style="color:#cbd5e1;">Mỗi card hiển thị thông tin về một chuỗi hỏng hóc nguy cơ cao:</p>
@@ -486,17 +723,16 @@ def render_guide_page():
 <p style="color:#cbd5e1;">⚠️ Nếu có <b>≥ 2 lần Pilot Report (Type P)</b>, hệ thống sẽ đưa ra <span style="color:#f87171; font-weight:bold;">CẢNH BÁO NGHIÊM TRỌNG</span> và đề nghị dừng tàu.</p>
 
 <h3 style="color:#f87171;">Ghi chú kỹ thuật (Comment)</h3>
-<p style="color:#cbd5e1;">Phía bên phải mỗi card, kỹ sư có thể:</p>
+<p style="color:#cbd5e1;">Ở cột bên phải danh sách card, kỹ sư có thể:</p>
 <ol style="color:#cbd5e1;">
+    <li>Chọn cảnh báo (Tàu bay | ATA) cần ghi chú</li>
     <li>Nhập đánh giá, link tài liệu, hoặc hành động đã thực hiện</li>
     <li>Bấm <b>"💾 Lưu & Sync"</b> để lưu vào file local và đồng bộ lên Google Sheet</li>
 </ol>
 </div>
-        """, unsafe_allow_html=True)
-
-    # --- Section 5: Matrix Tab ---
-    with st.expander("📉 **Tab: Ma trận Tổng quan**"):
-        st.markdown("""
+        """),
+    # Section 5: Matrix Tab
+    ("📉 **Tab: Ma trận Tổng quan**", False, """
 <div class="glass-card">
 <h3 style="color:#a78bfa; margin-top:0;">Ma trận Reliability (A/C vs ATA)</h3>
 <p style="color:#cbd5e1;">Bảng chéo giữa <b>Tàu bay</b> (hàng) và <b>Hệ thống ATA 2 chữ số</b> (cột):</p>
@@ -509,28 +745,24 @@ def render_guide_page():
 <h3 style="color:#a78bfa;">Drill-down Chi tiết</h3>
 <p style="color:#cbd5e1;">Phía dưới ma trận, chọn cụ thể <b>Tàu bay</b> và <b>ATA</b> để xem bảng chi tiết từng WO gồm: Ngày, Số WO, Type, ATA chi tiết, Mô tả, Hành động.</p>
 </div>
-        """, unsafe_allow_html=True)
-
-    # --- Section 6: Data Tab ---
-    with st.expander("📋 **Tab: Dữ liệu chi tiết**"):
-        st.markdown("""
+        """),
+    # Section 6: Data Tab
+    ("📋 **Tab: Dữ liệu chi tiết**", False, """
 <div class="glass-card">
 <h3 style="color:#38bdf8; margin-top:0;">Bảng tổng hợp</h3>
 <p style="color:#cbd5e1;">Hiển thị toàn bộ kết quả phân tích ở dạng bảng, gồm: A/C, ATA, Ngày xảy ra, Số WO, Kết luận, Tóm tắt tình trạng.</p>
-<p style="color:#cbd5e1;">Các dòng được <b>tô màu</b> theo kết luận để dễ nhận biết.</p>
+<p style="color:#cbd5e1;">Cột Kết luận có <b>biểu tượng</b> (🔴 ⚠️ ✅ 📋) theo kết luận để dễ nhận biết. Bảng dài được chia trang.</p>
 
 <h3 style="color:#38bdf8;">Tải báo cáo Excel</h3>
-<p style="color:#cbd5e1;">Bấm nút <b>"💾 Tải báo cáo Excel"</b> ở cuối tab để tải file Excel gồm 2 sheet:</p>
+<p style="color:#cbd5e1;">Bấm <b>"📦 Chuẩn bị báo cáo Excel"</b> ở cuối tab, sau đó bấm <b>"💾 Tải báo cáo Excel"</b> để tải file Excel gồm 2 sheet:</p>
 <ul style="color:#cbd5e1;">
     <li><b>All Data</b> — Toàn bộ kết quả phân tích</li>
     <li><b>Warnings</b> — Chỉ các cảnh báo, kèm khuyến cáo chi tiết</li>
 </ul>
 </div>
-        """, unsafe_allow_html=True)
-
-    # --- Section 7: FAQ ---
-    with st.expander("❓ **Câu hỏi thường gặp (FAQ)**"):
-        st.markdown("""
+        """),
+    # Section 7: FAQ
+    ("❓ **Câu hỏi thường gặp (FAQ)**", False, """
 <div class="glass-card">
 <h3 style="color:#e2e8f0; margin-top:0;">Q: File upload bị lỗi "Không thể đọc dữ liệu" ?</h3>
 <p style="color:#cbd5e1;">Kiểm tra file có đúng định dạng <code>.xlsx/.xls</code> và chứa đầy đủ các cột bắt buộc. Một số tên cột có thể khác (ví dụ: "Issued" thay vì "Issue date") — hệ thống sẽ tự nhận diện các biến thể phổ biến.</p>
@@ -547,15 +779,63 @@ def render_guide_page():
 <h3 style="color:#e2e8f0;">Q: Liên hệ hỗ trợ ở đâu?</h3>
 <p style="color:#cbd5e1;">Liên hệ <b>Technical Department — Vietnam Airlines</b> để được hỗ trợ kỹ thuật hoặc cấp tài khoản.</p>
 </div>
-        """, unsafe_allow_html=True)
+        """),
+)
+
+def render_guide_page():
+    """Render the User Guide page with glassmorphism styling"""
+    st.markdown(GUIDE_HEADER_HTML, unsafe_allow_html=True)
+    
+    for title, expanded, body in GUIDE_SECTIONS:
+        with st.expander(title, expanded=expanded):
+            st.markdown(body, unsafe_allow_html=True)
+
+
+@st.fragment
+def render_comment_editor(flags, recommendations, sheet_url):
+    """Comment editor of the warnings view; picking a flag or saving reruns only this fragment"""
+    st.markdown(f"**📝 Ghi chú kỹ thuật**")
+    r = st.selectbox(
+        "Cảnh báo",
+        flags,
+        format_func=lambda flag: f"{flag.aircraft} | ATA {flag.ata}",
+        key="comment_flag_sel"
+    )
+    
+    if r is not None:
+        # Get existing comment
+        current_comment = load_comment_index().get(f"{r.aircraft}_{r.ata}", "")
+        
+        # In a form, editing the text does not rerun the app; only the submit button does
+        with st.form(key="comment_form"):
+            new_comment = st.text_area(
+                label="Nội dung đánh giá/Hành động",
+                value=current_comment,
+                height=150,
+                key=f"comment_{r.aircraft}_{r.ata}",
+                placeholder="Nhập đánh giá của kỹ sư, Link tài liệu, hoặc Link Google Sheet liên quan..."
+            )
+            submitted = st.form_submit_button("💾 Lưu & Sync")
+        
+        if submitted:
+            # sheet_url is the Apps Script URL from the sidebar
+            success, msg = save_comment(r, recommendations[(r.aircraft, r.ata)], new_comment, sheet_url=sheet_url)
+            if success:
+                st.success(msg)
+            else:
+                st.error(msg)
 
 
 def main():
     # Login widget
     try:
-        # In newer versions of streamlit-authenticator (0.3.0+), 
-        # the parameters have changed. Using keyword arguments is safer.
-        authentication_data = authenticator.login(location='main')
+        # Already logged in this session: skip the cookie decode / password check on every rerun
+        if st.session_state.get('authentication_status') is True:
+            authentication_data = None
+        else:
+            # In newer versions of streamlit-authenticator (0.3.0+), 
+            # the parameters have changed. Using keyword arguments is safer.
+            authentication_data = authenticator.login(location='main')
         
         # Unpack based on return type (can be a tuple or dict depending on exact minor version)
         if isinstance(authentication_data, tuple):
@@ -619,6 +899,8 @@ def main():
                     "https://docs.google.com/spreadsheets/d/1Uy3znNoFTVoHl5xQHyQ54Sx70XUdlvDZmEWInK0Mgq0/edit?gid=0#gid=0",
                     use_container_width=True
                 )
+                if st.button("🔄 Sync toàn bộ ghi chú", use_container_width=True, help="Gửi lại tất cả ghi chú đã lưu local lên Google Sheet (ví dụ sau khi sync lỗi)"):
+                    st.toast(f"⏳ Đang sync {sync_all_comments(apps_script_url)} ghi chú...")
         
         st.info("💡 **Mẹo:** Khi app cập nhật, bấm **'Rerun'** ở góc phải màn hình để giữ lại dữ liệu, đừng F5.")
 
@@ -660,10 +942,21 @@ Hệ thống hỗ trợ đánh giá độ tin cậy tàu bay, phát hiện hỏn
         st.markdown(landing_html, unsafe_allow_html=True)
         return
 
+    report_pending_syncs()
+
     # Process Data
     try:
-        df = load_data(uploaded_file)
-        results = run_analysis(df, exclude_s)
+        file_hash = hashlib.md5(uploaded_file.getbuffer()).hexdigest()
+        # Filter changes and comment saves rerun the script: reuse this session's results
+        analysis_key = (uploaded_file.name, file_hash, exclude_s, ANALYSIS_VERSION)
+        if st.session_state.get('analysis_key') == analysis_key:
+            results, results_df = st.session_state['analysis_results']
+        else:
+            df = load_data(file_hash, uploaded_file)
+            results = run_analysis(file_hash, df, exclude_s, ANALYSIS_VERSION)
+            results_df = results_frame(results)
+            st.session_state['analysis_key'] = analysis_key
+            st.session_state['analysis_results'] = (results, results_df)
         
         if not results:
             st.error("❌ Không thể đọc dữ liệu. Vui lòng kiểm tra format file.")
@@ -676,10 +969,9 @@ Hệ thống hỗ trợ đánh giá độ tin cậy tàu bay, phát hiện hỏn
         st.markdown('<div class="glass-card" style="padding: 15px 20px;">', unsafe_allow_html=True)
         col_f1, col_f2, col_f3 = st.columns([1, 1, 3])
         
-        df_filtered_raw = filter_data(df) # Just to get keys if needed, but we filter results directly
-        
-        aircraft_list = sorted(set(r.aircraft for r in results))
-        ata_list = sorted(set(r.ata_2digit for r in results))
+        # Filters and metrics are column masks over results_df; np.unique sorts like sorted(set(...))
+        aircraft_list = np.unique(results_df['aircraft'].to_numpy()).tolist()
+        ata_list = np.unique(results_df['ata_2digit'].to_numpy()).tolist()
         
         with col_f1:
             selected_ac = st.selectbox("Tàu bay (A/C)", ['All'] + aircraft_list)
@@ -688,17 +980,25 @@ Hệ thống hỗ trợ đánh giá độ tin cậy tàu bay, phát hiện hỏn
         st.markdown('</div>', unsafe_allow_html=True)
 
         # Apply logic
-        filtered = results
+        mask = np.ones(len(results_df), dtype=bool)
         if selected_ac != 'All':
-            filtered = [r for r in filtered if r.aircraft == selected_ac]
+            mask &= (results_df['aircraft'] == selected_ac).to_numpy()
         if selected_ata != 'All':
-            filtered = [r for r in filtered if r.ata_2digit == selected_ata]
+            mask &= (results_df['ata_2digit'] == selected_ata).to_numpy()
+        filtered_df = results_df[mask]
+        filtered = [results[i] for i in np.flatnonzero(mask)]
+        # Identifies the filtered view in the caches of the tables and the Excel report
+        view_key = (file_hash, exclude_s, ANALYSIS_VERSION, selected_ac, selected_ata)
 
-        # Calculate Metrics
-        total_wo = sum(r.wo_count for r in filtered)
-        red_flags = get_red_flags(filtered)
-        reset_cnt = len([r for r in filtered if r.conclusion == 'RESET_ONLY_REPEAT'])
-        eff_cnt = len([r for r in filtered if r.conclusion == 'CORRECTIVE_OK'])
+        # Calculate Metrics (one count pass over the conclusions instead of a list scan per metric)
+        total_wo = int(filtered_df['wo_count'].sum())
+        conclusion_counts = filtered_df['conclusion'].value_counts()
+        reset_cnt = int(conclusion_counts.get('RESET_ONLY_REPEAT', 0))
+        eff_cnt = int(conclusion_counts.get('CORRECTIVE_OK', 0))
+        red_mask = mask & results_df['conclusion'].isin(RED_FLAG_CONCLUSIONS).to_numpy()
+        red_flags = [results[i] for i in np.flatnonzero(red_mask)]
+        # Each red flag's recommendation is used by every detail view and the export: build it once
+        recommendations = {(r.aircraft, r.ata): generate_recommendation(r) for r in red_flags}
 
         # Display Metrics
         m1, m2, m3, m4 = st.columns(4)
@@ -707,70 +1007,48 @@ Hệ thống hỗ trợ đánh giá độ tin cậy tàu bay, phát hiện hỏn
         with m3: st.markdown(create_metric_card(reset_cnt, "Reset Only", "⚠️", "orange"), unsafe_allow_html=True)
         with m4: st.markdown(create_metric_card(eff_cnt, "Fixed Effectively", "✅", "green"), unsafe_allow_html=True)
 
-        # Tabbed View for Details
-        tab1, tab2, tab3 = st.tabs(["🔴 Cảnh báo & Khuyến cáo", "📉 Ma trận Tổng quan", "📋 Dữ liệu chi tiết"])
+        # Detail views: unlike st.tabs, a radio runs only the code of the view on screen
+        view = st.radio("Chế độ xem", DETAIL_VIEWS, horizontal=True, key="detail_view", label_visibility="collapsed")
 
-        with tab1:
+        if view == DETAIL_VIEWS[0]:
             if red_flags:
                 st.markdown("### 🚨 Khuyến cáo kỹ thuật & Đánh giá")
                 
-                # Loop through red flags with index for unique keys
-                for i, r in enumerate(red_flags):
-                    rec_data = generate_recommendation(r) # Now returns dict
-                    if rec_data:
-                        # Create 2 columns: Recommendation Card (Left) - Comment (Right)
-                        c1, c2 = st.columns([2, 1], gap="medium")
-                        
-                        with c1:
-                            st.markdown(create_recommendation_card_html(r, rec_data), unsafe_allow_html=True)
-                            
-                        with c2:
-                            # Comment handling
-                            st.markdown(f"**📝 Ghi chú kỹ thuật**")
-                            # Get existing comment
-                            current_comment = get_comment_text(r.aircraft, r.ata)
-                            
-                            new_comment = st.text_area(
-                                label="Nội dung đánh giá/Hành động",
-                                value=current_comment,
-                                height=150,
-                                key=f"comment_{r.aircraft}_{r.ata}_{i}",
-                                placeholder="Nhập đánh giá của kỹ sư, Link tài liệu, hoặc Link Google Sheet liên quan..."
-                            )
-                            
-                            if st.button("💾 Lưu & Sync", key=f"btn_save_{r.aircraft}_{r.ata}_{i}"):
-                                # Updated to pass apps_script_url
-                                success, msg = save_comment(r, rec_data, new_comment, sheet_url=apps_script_url)
-                                if success:
-                                    st.success(msg)
-                                else:
-                                    st.error(msg)
-                        
-                        st.markdown("---") # Separator
-                        
+                # The cards of one page go out as one markdown element; only the selected red flag gets comment widgets
+                card_flags = [r for r in red_flags if recommendations[(r.aircraft, r.ata)]]
+                page_flags = card_flags[page_slice(len(card_flags), "card_page", CARD_PAGE_SIZE)]
+                cards_html = "\n\n".join(
+                    create_recommendation_card_html(r, recommendations[(r.aircraft, r.ata)]) for r in page_flags
+                )
+                
+                # Create 2 columns: Recommendation Cards (Left) - Comment editor (Right)
+                c1, c2 = st.columns([2, 1], gap="medium")
+                
+                with c1:
+                    st.markdown(cards_html, unsafe_allow_html=True)
+                    
+                with c2:
+                    render_comment_editor(page_flags, recommendations, apps_script_url)
+                    
             else:
                 st.success("🎉 Không phát hiện cảnh báo nghiêm trọng nào trong dữ liệu được lọc.")
 
-        with tab2:
+        elif view == DETAIL_VIEWS[1]:
             st.markdown("### Ma trận Reliability (A/C vs ATA)")
             
-            # Get red flags for summary table
-            red_flags_only = get_red_flags(filtered)
-            
-            if red_flags_only:
+            if red_flags:
                 # 1. Summary Table of Critical Issues (Red Flags)
                 st.markdown("#### 🔴 Danh sách Hỏng hóc Nghiêm trọng")
-                summary_data = []
-                for r in red_flags_only:
-                    summary_data.append({
-                        "Aircraft": r.aircraft,
-                        "ATA Chi tiết": r.ata,
-                        "Hệ thống": r.ata_2digit,
-                        "Số lần": r.wo_count,
-                        "Kết luận": "Reset lặp lại" if r.conclusion == "RESET_ONLY_REPEAT" else "Corrective không hiệu quả"
-                    })
-                
-                summary_df = pd.DataFrame(summary_data)
+                summary_df = pd.DataFrame({
+                    "Aircraft": [r.aircraft for r in red_flags],
+                    "ATA Chi tiết": [r.ata for r in red_flags],
+                    "Hệ thống": [r.ata_2digit for r in red_flags],
+                    "Số lần": [r.wo_count for r in red_flags],
+                    "Kết luận": np.where(
+                        [r.conclusion == "RESET_ONLY_REPEAT" for r in red_flags],
+                        "Reset lặp lại", "Corrective không hiệu quả"
+                    ),
+                })
                 st.dataframe(
                     summary_df,
                     use_container_width=True,
@@ -788,12 +1066,13 @@ Hệ thống hỗ trợ đánh giá độ tin cậy tàu bay, phát hiện hỏn
             
             st.markdown("Use the selectors below to view details for specific Aircraft and ATA.")
             
-            matrix_df = create_tic_tac_matrix(filtered)
+            matrix_df = build_matrix(view_key, filtered)
             
             if not matrix_df.empty:
                 # 2. Display Matrix
+                # Cells are 🔴/🟠 indicators, so no Styler is needed (a numeric gradient never applied to them)
                 st.dataframe(
-                    matrix_df.style.background_gradient(cmap='Reds', axis=None, vmin=0, vmax=5),
+                    matrix_df,
                     use_container_width=True,
                     height=400
                 )
@@ -802,86 +1081,52 @@ Hệ thống hỗ trợ đánh giá độ tin cậy tàu bay, phát hiện hỏn
                 st.markdown("### 🔎 Chi tiết sự kiện")
                 
                 # 2. Drill Down Selection
-                # Get list of A/C and ATAs that are in the filtered results (Red Flags only mostly)
-                red_flags_only = get_red_flags(filtered)
-                
-                if red_flags_only:
-                    ac_options = sorted(list(set(r.aircraft for r in red_flags_only)))
+                # A/C and ATAs of the red flags in the filtered results
+                if red_flags:
+                    # One pass: first red flag per (A/C, ATA 2-digit) and the ATAs of each A/C
+                    rf_index = {}
+                    ata_by_ac = {}
+                    for r in red_flags:
+                        rf_index.setdefault((r.aircraft, r.ata_2digit), r)
+                        ata_by_ac.setdefault(r.aircraft, set()).add(r.ata_2digit)
+                    ac_options = sorted(ata_by_ac)
                     
                     c_sel1, c_sel2 = st.columns(2)
                     with c_sel1:
                         sel_ac = st.selectbox("Chọn Tàu bay (A/C):", ac_options, key="matrix_ac_sel")
                     
                     # Filter ATAs for selected A/C
-                    ata_options = sorted(list(set(r.ata_2digit for r in red_flags_only if r.aircraft == sel_ac)))
+                    ata_options = sorted(ata_by_ac[sel_ac])
                     
                     with c_sel2:
                         sel_ata = st.selectbox("Chọn Hệ thống (ATA):", ata_options, key="matrix_ata_sel")
                     
                     # 3. Find and Display Details
-                    selected_result = next((r for r in red_flags_only if r.aircraft == sel_ac and r.ata_2digit == sel_ata), None)
+                    selected_result = rf_index.get((sel_ac, sel_ata))
                     
                     if selected_result:
-                        # Convert events to DataFrame for nice display
-                        detail_data = []
-                        for e in selected_result.events:
-                            detail_data.append({
-                                "Ngày": e.issued_date.strftime('%d/%m/%Y'),
-                                "Số WO": e.wo,
-                                "Type": e.wo_type,
-                                "ATA": selected_result.ata,
-                                "Mô tả": e.description,
-                                "Hành động": e.action
-                            })
-                        
-                        # Create DataFrame
-                        df_details = pd.DataFrame(detail_data)
-                        
-                        # Rename for display
-                        df_display = df_details.rename(columns={
-                            "Mô tả": "Mô tả (Description)", 
-                            "Hành động": "Hành động (Action)"
-                        })
-
-                        # custom HTML table for full text wrapping control
-                        html_table = df_display.to_html(index=False, classes='detail-table', escape=True)
-                        
-                        # CSS and HTML must not be indented to avoid Markdown code block rendering
-                        st.markdown(f"""
-<style>
-.detail-table {{ 
-    width: 100%; 
-    border-collapse: collapse; 
-    color: #e2e8f0; 
-    font-size: 0.9rem; 
-    margin-bottom: 20px;
-}}
-.detail-table th {{ 
-    background-color: #334155; 
-    padding: 12px 10px; 
-    text-align: left; 
-    border: 1px solid #475569; 
-    font-weight: 600;
-}}
-.detail-table td {{ 
-    background-color: rgba(30, 41, 59, 0.4); 
-    padding: 10px; 
-    border: 1px solid #475569; 
-    vertical-align: top; 
-    white-space: pre-wrap; /* Text wrapping */
-    word-wrap: break-word;
-    line-height: 1.5;
-}}
-.detail-table tr:hover td {{
-    background-color: rgba(51, 65, 85, 0.6);
-}}
-</style>
-<div style="overflow-x: auto;">
+                        if len(selected_result.events) > DETAIL_TABLE_HTML_MAX_ROWS:
+                            # Long chains: the Arrow grid only paints the visible rows
+                            st.dataframe(
+                                create_event_table_df(selected_result),
+                                use_container_width=True,
+                                hide_index=True,
+                                column_config={
+                                    "Mô tả (Description)": st.column_config.TextColumn(width="large"),
+                                    "Hành động (Action)": st.column_config.TextColumn(width="large"),
+                                }
+                            )
+                        else:
+                            # custom HTML table for full text wrapping control
+                            html_table = create_event_table_html(selected_result)
+                            
+                            # HTML must not be indented to avoid Markdown code block rendering (.detail-table CSS is in APP_CSS)
+                            st.markdown(f"""<div style="overflow-x: auto;">
 {html_table}
 </div>""", unsafe_allow_html=True)
                         
                         # Show recommendation as well
-                        rec_dict = generate_recommendation(selected_result)
+                        rec_dict = recommendations[(selected_result.aircraft, selected_result.ata)]
                         if rec_dict:
                             st.info(f"💡 **Đánh giá:** {rec_dict.get('assessment', '')}\n\n**Khuyến cáo:** {rec_dict.get('recommendation', '')}")
                     
@@ -891,33 +1136,33 @@ Hệ thống hỗ trợ đánh giá độ tin cậy tàu bay, phát hiện hỏn
             else:
                 st.info("Không có dữ liệu cho ma trận (Không có cảnh báo đỏ/cam).")
 
-        with tab3:
+        else:
             st.markdown("### Bảng tổng hợp chi tiết")
-            summary_df = results_to_dataframe(filtered)
+            summary_df = build_summary_table(view_key, filtered)
             
-            def color_conclusion(val):
-                color = 'white'
-                if val == 'CORRECTIVE_NOT_EFFECTIVE': color = '#f87171'
-                elif val == 'RESET_ONLY_REPEAT': color = '#fbbf24'
-                elif val == 'CORRECTIVE_OK': color = '#34d399'
-                return f'color: {color}'
+            # Only the current page is serialized; the export below still covers every row
+            page_size = table_page_size(len(summary_df), key="detail_page_size")
+            page_df = summary_df.iloc[page_slice(len(summary_df), "detail_page", page_size)]
+            
+            # Icons instead of a Styler: no per-cell CSS to serialize, and renaming the
+            # categories touches each conclusion once rather than each row
+            page_df = page_df.assign(**{'Kết luận': page_df['Kết luận'].cat.rename_categories(
+                lambda conclusion: f"{CONCLUSION_ICONS.get(conclusion, '')} {conclusion}"
+            )})
 
             st.dataframe(
-                summary_df.style.applymap(color_conclusion, subset=['Kết luận']),
+                page_df,
                 use_container_width=True,
                 height=600
             )
             
-            # Export
-            output = BytesIO()
-            with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-                summary_df.to_excel(writer, sheet_name='All Data', index=False)
-                if red_flags:
-                    rf_df = results_to_dataframe(red_flags)
-                    rf_df['Khuyến cáo'] = [generate_recommendation(r).get('full_html', '') for r in red_flags]
-                    rf_df.to_excel(writer, sheet_name='Warnings', index=False)
-            output.seek(0)
-            st.download_button("💾 Tải báo cáo Excel", output, "report.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+            # Export: built only once requested for the current view (and cached per view_key),
+            # so filter changes and other reruns do not run xlsxwriter
+            if st.button("📦 Chuẩn bị báo cáo Excel", key="btn_prepare_report"):
+                st.session_state['report_view_key'] = view_key
+            if st.session_state.get('report_view_key') == view_key:
+                report_bytes = build_excel_report(view_key, summary_df, red_flags, recommendations)
+                st.download_button("💾 Tải báo cáo Excel", report_bytes, "report.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
 
     except Exception as e:
         st.error(f"Đã xảy ra lỗi: {str(e)}")
@@ -3,13 +3,13 @@ Script to generate password hash for streamlit-authenticator
 Run this script to create new password hashes
 """
 
-import streamlit_authenticator as stauth
+import bcrypt  # Installed with streamlit-authenticator; hashing needs nothing else from it
 
 # List of passwords you want to hash
 passwords = ['vna1234']  # Replace with your desired password
 
-# Generate hashes
-hashed_passwords = stauth.Hasher(passwords).generate()
+# Generate hashes (bcrypt, 12 rounds: the $2b$12$ format streamlit-authenticator verifies)
+hashed_passwords = [bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=12)).decode() for password in passwords]
 
 print("Generated password hashes:")
 print("=" * 50)
@@ -0,0 +1,88 @@
+"""Unit tests for analysis.py (run with: python -m unittest discover tests)"""
+import os
+import sys
+import unittest
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from analysis import analyze_work_orders, extract_ata_from_text
+
+
+def corrected_ata(text):
+    """ATA corrected from a W/O Description holding text (original ATA 21-51)"""
+    return extract_ata_from_text(text, "", "2151")
+
+
+class TestAtaReference(unittest.TestCase):
+    """Task reference precedence when a text holds several references"""
+
+    def test_keyword_precedence_within_high_tier(self):
+        # TSM outranks FIM even when the FIM reference comes first in the text
+        self.assertEqual(corrected_ata("FIM 21-21 AND TSM 34-11"), "34-11")
+        self.assertEqual(corrected_ata("FIM 21-21 AFI: 26-15 TSM 34-11"), "34-11")
+        self.assertEqual(corrected_ata("FIM 21-21 AFI: 26-15"), "26-15")
+
+    def test_keyword_precedence_within_medium_tier(self):
+        self.assertEqual(corrected_ata("IPD 21-21 IPC 34-11"), "34-11")
+
+    def test_tier_precedence(self):
+        self.assertEqual(corrected_ata("AMM 72-32 IPD 21-21"), "21-21")
+        self.assertEqual(corrected_ata("AMM 72-32 IPC 2121 FIM 3411"), "34-11")
+
+    def test_pattern_precedence_within_keyword(self):
+        # colon, then TASK, then plain space
+        self.assertEqual(corrected_ata("AMM 2121 AMM TASK 3411"), "34-11")
+        self.assertEqual(corrected_ata("TSM TASK 2121 TSM: 3411"), "34-11")
+        self.assertEqual(corrected_ata("TSM 2121 TSM TASK 3411 TSM:2945"), "29-45")
+
+    def test_first_match_of_winning_pattern(self):
+        self.assertEqual(corrected_ata("AMM 2121 AMM 3411"), "21-21")
+        self.assertEqual(corrected_ata("AMM 72-32-86 REF AMM 21-00"), "72-32")
+
+    def test_no_reference_keeps_original_ata(self):
+        self.assertEqual(corrected_ata("REPLACED VALVE IAW AMM"), "21-51")
+        self.assertEqual(corrected_ata(""), "21-51")
+
+    def test_reference_needs_an_action(self):
+        self.assertEqual(extract_ata_from_text("FIM 21-21", "TSM 34-11 DONE", "2151"), "34-11")
+        self.assertEqual(extract_ata_from_text("TSM 34-11", None, "2151"), "21-51")
+
+
+class TestConclusion(unittest.TestCase):
+    """Conclusions per A/C + ATA group"""
+
+    def make_frame(self, issued):
+        return pd.DataFrame({
+            'A/C': ['VN-A321'] * 3,
+            'ATA': ['2151'] * 3,
+            'WO': ['1', '2', '3'],
+            'Type': ['M'] * 3,
+            'W/O Description': ['PACK FAULT'] * 3,
+            'W/O Action': ['RESET PACK OK', 'REPLACED PACK VALVE', 'RESET OK'],
+            'Issued': issued,
+        })
+
+    def test_recurrence_after_corrective(self):
+        results = analyze_work_orders(self.make_frame(['01/02/2024', '03/02/2024', '05/02/2024']))
+        self.assertEqual([(r.wo_count, r.conclusion) for r in results], [(3, "CORRECTIVE_NOT_EFFECTIVE")])
+
+    def test_same_day_recurrence_is_ok(self):
+        results = analyze_work_orders(self.make_frame(['01/02/2024', '03/02/2024', '03/02/2024']))
+        self.assertEqual([r.conclusion for r in results], ["CORRECTIVE_OK"])
+
+    def test_reset_only_repeat(self):
+        frame = self.make_frame(['01/02/2024', '03/02/2024', '05/02/2024'])
+        frame['W/O Action'] = 'RESET OK'
+        results = analyze_work_orders(frame)
+        self.assertEqual([r.conclusion for r in results], ["RESET_ONLY_REPEAT"])
+
+    def test_missing_dates_never_count_as_recurrence(self):
+        # Only unparseable dates: no recurrence can be shown, so the corrective action stands
+        results = analyze_work_orders(self.make_frame(['n/a', None, '']))
+        self.assertEqual([(r.wo_count, r.conclusion, r.dates) for r in results], [(3, "CORRECTIVE_OK", ['', '', ''])])
+
+
+if __name__ == '__main__':
+    unittest.main()